@@ -0,0 +1,11 @@
+from core.testing import TemporaryState
+
+state = TemporaryState()
+
+
+def pytest_configure(config):
+    state.start()
+
+
+def pytest_unconfigure(config):
+    state.stop()
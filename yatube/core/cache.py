@@ -0,0 +1,461 @@
+"""Бэкенды кеша: общий для процессов хоста MmapCache и TieredCache -
+локальный LRU процесса перед любым другим бэкендом.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+from .timing import count_cache
+
+MAGIC = b'YTCACHE1'
+# magic, подпись раскладки, счётчик обращений для LRU, эпоха clear().
+HEADER = struct.Struct('<8s8sQI')
+# хеш ключа, срок, последнее обращение, эпоха, длины ключа и значения.
+SLOT = struct.Struct('<QdQIII')
+WAYS = 8
+SLAB_SIZES = (256, 1024, 4096, 16384, 65536)
+MAX_SIZE = 64 * 1024 * 1024
+
+
+class Slab:
+    """Класс слотов одного размера."""
+
+    def __init__(self, offset, slot_size, sets):
+        self.offset = offset
+        self.slot_size = slot_size
+        self.sets = sets
+
+    @property
+    def size(self):
+        return self.sets * WAYS * self.slot_size
+
+    def slots(self, key_hash):
+        """Смещения слотов набора, в который попадает ключ."""
+        first = self.offset + key_hash % self.sets * WAYS * self.slot_size
+        return range(first, first + WAYS * self.slot_size, self.slot_size)
+
+
+class MmapCache(BaseCache):
+    """Кеш в файле LOCATION, отображённом в память.
+
+    Файл разбит на классы слотов одного размера (как слабы memcached),
+    каждый класс - на наборы по WAYS слотов. Ключ попадает в набор по
+    хешу, внутри набора вытесняется давно не использованный слот. Все
+    операции, включая incr, идут под блокировкой файла и потока, поэтому
+    воркеры gunicorn видят одни и те же значения и одни и те же сбросы.
+
+    OPTIONS: MAX_SIZE - размер файла в байтах, SLAB_SIZES - размеры
+    слотов. Значение, которое не влезает в самый большой слот,
+    не кешируется.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        slab_sizes = sorted(options.get('SLAB_SIZES', SLAB_SIZES))
+        share = options.get('MAX_SIZE', MAX_SIZE) // len(slab_sizes)
+        self._slabs = []
+        offset = HEADER.size
+        for slot_size in slab_sizes:
+            slab = Slab(offset, slot_size, max(1, share // (slot_size * WAYS)))
+            self._slabs.append(slab)
+            offset += slab.size
+        self._size = offset
+        self._layout = hashlib.blake2b(repr([
+            (slab.slot_size, slab.sets) for slab in self._slabs
+        ]).encode(), digest_size=8).digest()
+        self._path = location
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        """Открывает файл в текущем процессе: после fork - заново.
+
+        В файле pickle, поэтому чужой файл не открывается: ни ссылка,
+        ни файл другого владельца или с доступом для группы и остальных.
+        """
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, 0o700, exist_ok=True)
+        fd = os.open(
+            self._path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600
+        )
+        stat = os.fstat(fd)
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+            os.close(fd)
+            raise PermissionError(
+                f'Файл кеша {self._path} должен принадлежать процессу '
+                'и быть закрыт для группы и остальных'
+            )
+        self._fd = fd
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if (
+                os.fstat(self._fd).st_size != self._size
+                or not self._is_ours(os.pread(self._fd, HEADER.size, 0))
+            ):
+                self._format()
+            self._map = mmap.mmap(self._fd, self._size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._pid = os.getpid()
+
+    def _is_ours(self, header):
+        return header[:16] == MAGIC + self._layout
+
+    def _format(self):
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, self._size)
+        os.pwrite(self._fd, HEADER.pack(MAGIC, self._layout, 0, 0), 0)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if not self._is_ours(self._map[:HEADER.size]):
+                    # Файл переразметил процесс с другими OPTIONS.
+                    self._map.close()
+                    self._format()
+                    self._map = mmap.mmap(self._fd, self._size)
+                yield self._map
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        key = key.encode()
+        return key, int.from_bytes(
+            hashlib.blake2b(key, digest_size=8).digest(), 'little'
+        )
+
+    def _expiry(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return 0.0 if expires is None else expires
+
+    def _tick(self, m):
+        magic, layout, tick, epoch = HEADER.unpack_from(m, 0)
+        HEADER.pack_into(m, 0, magic, layout, tick + 1, epoch)
+        return tick + 1, epoch
+
+    def _find(self, m, key, key_hash):
+        """Слот живой записи ключа: (смещение, срок, длина значения)."""
+        epoch = HEADER.unpack_from(m, 0)[3]
+        now = time.time()
+        for slab in self._slabs:
+            for pos in slab.slots(key_hash):
+                hash_, expires, _, slot_epoch, key_len, value_len = (
+                    SLOT.unpack_from(m, pos)
+                )
+                if (
+                    hash_ != key_hash or slot_epoch != epoch
+                    or not key_len
+                    or m[pos + SLOT.size:pos + SLOT.size + key_len] != key
+                ):
+                    continue
+                if expires and expires <= now:
+                    SLOT.pack_into(m, pos, 0, 0, 0, 0, 0, 0)
+                    return None
+                return pos, expires, value_len
+        return None
+
+    def _read(self, m, key, pos, value_len):
+        tick, epoch = self._tick(m)
+        hash_, expires, _, _, key_len, _ = SLOT.unpack_from(m, pos)
+        SLOT.pack_into(
+            m, pos, hash_, expires, tick, epoch, key_len, value_len
+        )
+        start = pos + SLOT.size + len(key)
+        return m[start:start + value_len]
+
+    def _store(self, m, key, key_hash, value, expires):
+        """Пишет запись в свободный или самый старый слот набора."""
+        found = self._find(m, key, key_hash)
+        if found is not None:
+            SLOT.pack_into(m, found[0], 0, 0, 0, 0, 0, 0)
+        need = SLOT.size + len(key) + len(value)
+        slab = next(
+            (slab for slab in self._slabs if slab.slot_size >= need), None
+        )
+        if slab is None:
+            return False
+        tick, epoch = self._tick(m)
+        now = time.time()
+        victim, oldest = None, None
+        for pos in slab.slots(key_hash):
+            _, slot_expires, used, slot_epoch, key_len, _ = (
+                SLOT.unpack_from(m, pos)
+            )
+            if (
+                not key_len or slot_epoch != epoch
+                or slot_expires and slot_expires <= now
+            ):
+                victim = pos
+                break
+            if oldest is None or used < oldest:
+                victim, oldest = pos, used
+        SLOT.pack_into(
+            m, victim, key_hash, expires, tick, epoch, len(key), len(value)
+        )
+        start = victim + SLOT.size
+        m[start:start + len(key)] = key
+        m[start + len(key):start + len(key) + len(value)] = value
+        return True
+
+    def get(self, key, default=None, version=None):
+        key, key_hash = self._key(key, version)
+        with self._locked() as m:
+            found = self._find(m, key, key_hash)
+            if found is None:
+                return default
+            value = self._read(m, key, found[0], found[2])
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        """Все ключи за одну блокировку файла."""
+        found = {}
+        with self._locked() as m:
+            for original in keys:
+                key, key_hash = self._key(original, version)
+                entry = self._find(m, key, key_hash)
+                if entry is not None:
+                    found[original] = self._read(m, key, entry[0], entry[2])
+        return {key: pickle.loads(value) for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash = self._key(key, version)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._locked() as m:
+            self._store(m, key, key_hash, value, self._expiry(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash = self._key(key, version)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._locked() as m:
+            if self._find(m, key, key_hash) is not None:
+                return False
+            return self._store(
+                m, key, key_hash, value, self._expiry(timeout)
+            )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash = self._key(key, version)
+        with self._locked() as m:
+            found = self._find(m, key, key_hash)
+            if found is None:
+                return False
+            values = list(SLOT.unpack_from(m, found[0]))
+            values[1] = self._expiry(timeout)
+            SLOT.pack_into(m, found[0], *values)
+            return True
+
+    def delete(self, key, version=None):
+        key, key_hash = self._key(key, version)
+        with self._locked() as m:
+            found = self._find(m, key, key_hash)
+            if found is None:
+                return False
+            SLOT.pack_into(m, found[0], 0, 0, 0, 0, 0, 0)
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: чтение и запись под блокировкой."""
+        key, key_hash = self._key(key, version)
+        with self._locked() as m:
+            found = self._find(m, key, key_hash)
+            if found is None:
+                raise ValueError("Key '%s' not found" % key.decode())
+            pos, expires, value_len = found
+            value = pickle.loads(self._read(m, key, pos, value_len)) + delta
+            self._store(
+                m, key, key_hash,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires
+            )
+        return value
+
+    def clear(self):
+        """Сдвигает эпоху: слоты прошлых эпох считаются пустыми."""
+        with self._locked() as m:
+            magic, layout, tick, epoch = HEADER.unpack_from(m, 0)
+            HEADER.pack_into(m, 0, magic, layout, tick, epoch + 1)
+
+
+# Локальные уровни TieredCache по имени LOCATION: общие для всех потоков
+# процесса, как хранилища LocMemCache.
+_tiers = {}
+_tier_locks = {}
+MISSING = object()
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кеш: LRU в памяти процесса перед бэкендом L2.
+
+    Чтение идёт в L1, при промахе - в L2 с записью в L1; запись идёт
+    в оба уровня. Записи L1 живут не дольше L1_TIMEOUT секунд: столько
+    процесс может не видеть чужих изменений. Ключи с префиксами
+    VOLATILE_PREFIXES (поколения и счётчики лент) всегда читаются
+    из L2, поэтому их сдвиг сразу меняет ключи фрагментов во всех
+    процессах, а старые фрагменты уходят из L1 по LRU.
+
+    OPTIONS: L2 - псевдоним бэкенда в CACHES, L1_MAX_ENTRIES,
+    L1_TIMEOUT, VOLATILE_PREFIXES.
+
+    Чтения считаются в метрике yatube_cache_tier_requests_total
+    с меткой cache=LOCATION, поэтому доли попаданий L1 и L2 на /metrics
+    складываются по всем воркерам.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options['L2']
+        self._l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._volatile = tuple(options.get('VOLATILE_PREFIXES', ()))
+        self._name = name
+        self._l1 = _tiers.setdefault(name, OrderedDict())
+        self._lock = _tier_locks.setdefault(name, threading.Lock())
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _l1_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._l1.pop(key, None)
+                return MISSING
+            self._l1.move_to_end(key)
+        self._count('l1')
+        return pickle.loads(entry[1])
+
+    def _l1_set(self, key, value, timeout=None):
+        if timeout is not None and timeout <= 0:
+            self._l1_drop(key)
+            return
+        ttl = self._l1_timeout if timeout is None else min(
+            timeout, self._l1_timeout
+        )
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, pickled)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_drop(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _count(self, level, number=1):
+        """Чтения уровня level: l1, l2 или miss."""
+        if not number:
+            return
+        metrics.inc(
+            metrics.TIER_REQUESTS, {'cache': self._name, 'level': level},
+            number,
+        )
+        if level == 'miss':
+            count_cache(misses=number)
+        else:
+            count_cache(hits=number)
+
+    def get(self, key, default=None, version=None):
+        volatile = key.startswith(self._volatile)
+        if not volatile:
+            l1_key = self._l1_key(key, version)
+            value = self._l1_get(l1_key)
+            if value is not MISSING:
+                return value
+        value = self.l2.get(key, MISSING, version=version)
+        if value is MISSING:
+            self._count('miss')
+            return default
+        self._count('l2')
+        if not volatile:
+            self._l1_set(l1_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        """Промахи L1 добираются из L2 одним вызовом get_many."""
+        found = {}
+        rest = []
+        for key in keys:
+            if key.startswith(self._volatile):
+                rest.append(key)
+                continue
+            value = self._l1_get(self._l1_key(key, version))
+            if value is MISSING:
+                rest.append(key)
+            else:
+                found[key] = value
+        if rest:
+            fetched = self.l2.get_many(rest, version=version)
+            self._count('l2', len(fetched))
+            self._count('miss', len(rest) - len(fetched))
+            for key, value in fetched.items():
+                if not key.startswith(self._volatile):
+                    self._l1_set(self._l1_key(key, version), value)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        if not key.startswith(self._volatile):
+            self._l1_set(self._l1_key(key, version), value, self._ttl(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added and not key.startswith(self._volatile):
+            self._l1_set(self._l1_key(key, version), value, self._ttl(timeout))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_drop(self._l1_key(key, version))
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_drop(self._l1_key(key, version))
+        return self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_drop(self._l1_key(key, version))
+        self.l2.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_drop(self._l1_key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def _ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return timeout
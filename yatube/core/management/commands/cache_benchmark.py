@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import MmapCache
+
+
+def write_keys(cache, worker, keys):
+    for i in range(keys):
+        cache.set(f'worker{worker}:{i}', i)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает MmapCache с LocMemCache и FileBasedCache: '
+            'скорость операций и долю ключей, видных другим процессам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ops', type=int, default=2000,
+            help='Сколько операций каждого вида выполнить.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько процессов пишут ключи для проверки общего кеша.',
+        )
+
+    def handle(self, *args, ops, workers, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            backends = [
+                ('LocMemCache', LocMemCache(
+                    'benchmark', {'OPTIONS': {'MAX_ENTRIES': ops * 2}}
+                )),
+                ('FileBasedCache', FileBasedCache(
+                    os.path.join(directory, 'files'),
+                    {'OPTIONS': {'MAX_ENTRIES': ops * 2}},
+                )),
+                ('MmapCache', MmapCache(
+                    os.path.join(directory, 'mmap'), {}
+                )),
+            ]
+            self.stdout.write(
+                f'{"бэкенд":<16}{"set/с":>10}{"get/с":>10}{"incr/с":>10}'
+                f'{"общих":>8}'
+            )
+            for name, cache in backends:
+                cache.clear()
+                cache.set('counter', 0)
+                rates = [
+                    self.rate(ops, lambda i: cache.set(f'key{i}', i)),
+                    self.rate(ops, lambda i: cache.get(f'key{i}')),
+                    self.rate(ops, lambda i: cache.incr('counter')),
+                ]
+                shared = self.shared(cache, workers, max(1, ops // workers))
+                self.stdout.write(
+                    f'{name:<16}' + ''.join(f'{rate:>10.0f}' for rate in rates)
+                    + f'{shared:>8.0%}'
+                )
+
+    def rate(self, ops, operation):
+        start = time.perf_counter()
+        for i in range(ops):
+            operation(i)
+        return ops / (time.perf_counter() - start)
+
+    def shared(self, cache, workers, keys):
+        """Доля ключей, записанных воркерами, которую видит родитель."""
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=write_keys, args=(cache, worker, keys))
+            for worker in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        found = sum(
+            len(cache.get_many([f'worker{worker}:{i}' for i in range(keys)]))
+            for worker in range(workers)
+        )
+        return found / (workers * keys)
@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slow_queries import entries, percentile
+
+ORDERINGS = {
+    'total': lambda group: group['total'],
+    'count': lambda group: len(group['durations']),
+    'p95': lambda group: percentile(group['durations'], 0.95),
+}
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов: по отпечаткам запросов '
+            'с суммарным временем и перцентилями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            help='Журнал; по умолчанию SLOW_QUERY_LOG.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько отпечатков вывести.',
+        )
+        parser.add_argument(
+            '--sort', choices=ORDERINGS, default='total',
+            help='Порядок: по суммарному времени, числу или p95.',
+        )
+        parser.add_argument(
+            '--route', help='Только запросы этого маршрута.',
+        )
+
+    def handle(self, *args, path, limit, sort, route, **options):
+        path = path or settings.SLOW_QUERY_LOG
+        groups = {}
+        try:
+            for entry in entries(path):
+                if route and entry['route'] != route:
+                    continue
+                group = groups.setdefault(entry['fingerprint'], {
+                    'sql': entry['sql'],
+                    'plan': entry['plan'],
+                    'durations': [],
+                    'total': 0.0,
+                    'routes': defaultdict(int),
+                })
+                group['durations'].append(entry['duration_ms'])
+                group['total'] += entry['duration_ms']
+                group['routes'][entry['route'] or '-'] += 1
+        except FileNotFoundError:
+            raise CommandError(f'Журнала {path} нет.')
+        ordered = sorted(groups.items(), key=lambda item: ORDERINGS[sort](
+            item[1]
+        ), reverse=True)
+        for fingerprint, group in ordered[:limit]:
+            durations = group['durations']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{fingerprint}: {len(durations)} раз, '
+                f'всего {group["total"]:.1f} мс, '
+                + ', '.join(
+                    f'{name} {percentile(durations, share):.1f}'
+                    for name, share in (
+                        ('p50', 0.5), ('p95', 0.95), ('p99', 0.99)
+                    )
+                )
+                + f', max {max(durations):.1f} мс'
+            ))
+            self.stdout.write('  маршруты: ' + ', '.join(
+                f'{name} ({count})' for name, count in sorted(
+                    group['routes'].items(), key=lambda item: -item[1]
+                )
+            ))
+            self.stdout.write(f'  {group["sql"]}')
+            for line in group['plan'] or ():
+                self.stdout.write(f'    {line}')
+        self.stdout.write(
+            f'Отпечатков: {len(groups)}, записей: '
+            f'{sum(len(group["durations"]) for group in groups.values())}.'
+        )
@@ -0,0 +1,385 @@
+"""Метрики в текстовом формате Prometheus, общие для процессов хоста.
+
+Каждый процесс (воркер gunicorn, процесс пула миниатюр) пишет свои
+значения в собственный файл METRICS_DIR/<pid>.db, отображённый в память.
+Запись - pack_into под локом потоков своего процесса, межпроцессных
+блокировок нет. /metrics читает файлы всех процессов и складывает
+значения. Завершившийся процесс прибавляет свои значения к общему
+файлу aggregate.db и удаляет свой; файлы процессов, умерших без этого,
+так же сливает первый процесс, открывший после них свой файл. Слияние
+и чтение /metrics идут под блокировкой каталога, поэтому значение
+не считается дважды и не пропадает.
+
+Файл: занятая длина (Q), затем записи - длина ключа (I), ключ в UTF-8,
+дополненный до границы 8 байт, и значение (d). Длина в заголовке
+растёт только после записи всей записи: читатель видит целые записи.
+"""
+import fcntl
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+
+from django.conf import settings
+
+USED = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+AGGREGATE = 'aggregate.db'
+LOCK = 'metrics.lock'
+
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Имя: тип, описание и границы корзин для гистограмм.
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Запросы по маршрутам и статусам.', None,
+    ),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа по маршрутам.', SECONDS_BUCKETS,
+    ),
+    'yatube_request_queries': (
+        'histogram', 'Запросы к базе на ответ по маршрутам.',
+        QUERIES_BUCKETS,
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Обращения к кешу по маршрутам: hit или miss.', None,
+    ),
+    'yatube_cache_tier_requests_total': (
+        'counter', 'Чтения TieredCache по уровням: l1, l2 или miss.', None,
+    ),
+    'yatube_thumbnail_duration_seconds': (
+        'histogram', 'Подготовка миниатюры и уменьшенных копий картинки.',
+        SECONDS_BUCKETS,
+    ),
+}
+TIER_REQUESTS = 'yatube_cache_tier_requests_total'
+HIT_RATIO = 'yatube_cache_hit_ratio'
+L1_HIT_RATIO = 'yatube_cache_l1_hit_ratio'
+L2_HIT_RATIO = 'yatube_cache_l2_hit_ratio'
+# Доли, которые /metrics считает по суммам счётчиков всех процессов.
+GAUGES = {
+    HIT_RATIO: 'Доля попаданий в кеш по маршрутам.',
+    L1_HIT_RATIO: 'Доля чтений TieredCache из L1.',
+    L2_HIT_RATIO: 'Доля промахов L1 TieredCache, найденных в L2.',
+}
+
+
+class ProcessValues:
+    """Значения одного процесса в файле path."""
+
+    def __init__(self, path):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = os.fstat(self._fd).st_size
+        if size < USED.size:
+            size = INITIAL_SIZE
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._used = USED.unpack_from(self._map, 0)[0] or USED.size
+        self._positions = {
+            key: position
+            for key, position, _ in entries(self._map, self._used)
+        }
+
+    def add(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        value = VALUE.unpack_from(self._map, position)[0]
+        VALUE.pack_into(self._map, position, value + amount)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padded = KEY_LENGTH.size + len(encoded)
+        padded += -padded % VALUE.size
+        end = self._used + padded + VALUE.size
+        if end > len(self._map):
+            self._map.close()
+            size = max(end, 2 * os.fstat(self._fd).st_size)
+            os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+        KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        start = self._used + KEY_LENGTH.size
+        self._map[start:start + len(encoded)] = encoded
+        position = self._used + padded
+        VALUE.pack_into(self._map, position, 0.0)
+        self._used = end
+        USED.pack_into(self._map, 0, end)
+        self._positions[key] = position
+        return position
+
+
+def entries(data, used=None):
+    """Записи файла: (ключ, позиция значения, значение)."""
+    if used is None:
+        used = USED.unpack_from(data, 0)[0] if len(data) >= USED.size else 0
+    offset = USED.size
+    while offset < used:
+        length = KEY_LENGTH.unpack_from(data, offset)[0]
+        start = offset + KEY_LENGTH.size
+        key = bytes(data[start:start + length]).decode()
+        position = start + length + (-(KEY_LENGTH.size + length) % 8)
+        yield key, position, VALUE.unpack_from(data, position)[0]
+        offset = position + VALUE.size
+
+
+_lock = threading.Lock()
+_values = None
+_owner = None
+
+
+def directory():
+    return settings.METRICS_DIR
+
+
+@contextmanager
+def locked(path, exclusive=True):
+    """Блокировка каталога метрик path между процессами."""
+    os.makedirs(path, exist_ok=True)
+    fd = os.open(os.path.join(path, LOCK), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+def mark_process_dead(pid, path=None):
+    """Прибавляет значения процесса pid к aggregate.db и удаляет
+    его файл.
+    """
+    path = path or directory()
+    name = os.path.join(path, f'{pid}.db')
+    if not os.path.exists(name):
+        # Каталог мог быть удалён целиком - не создаём его заново.
+        return
+    with locked(path):
+        try:
+            with open(name, 'rb') as file_:
+                data = file_.read()
+        except FileNotFoundError:
+            return
+        aggregate = ProcessValues(os.path.join(path, AGGREGATE))
+        try:
+            for key, _, value in entries(data):
+                if value:
+                    aggregate.add(key, value)
+        finally:
+            aggregate.close()
+        os.remove(name)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect_dead_processes(path=None):
+    """Сливает файлы процессов, которых больше нет."""
+    path = path or directory()
+    for name in glob.glob(os.path.join(path, '*.db')):
+        pid = os.path.basename(name)[:-len('.db')]
+        if pid.isdigit() and int(pid) != os.getpid() and not is_alive(
+            int(pid)
+        ):
+            mark_process_dead(int(pid), path)
+
+
+def release_process_values():
+    """При выходе процесса отдаёт его значения в aggregate.db.
+
+    Наследник fork получает этот финализатор от родителя: сливает
+    файл только процесс, который его открыл.
+    """
+    global _values, _owner
+    with _lock:
+        if _owner is None or _owner[0] != os.getpid():
+            return
+        _values.close()
+        mark_process_dead(*_owner)
+        _values = _owner = None
+
+
+def process_values():
+    """Файл текущего процесса: после fork и смены каталога - свой.
+
+    Финализатор multiprocessing срабатывает и при обычном выходе,
+    и в процессах пулов, которые завершаются без atexit.
+    """
+    global _values, _owner
+    owner = (os.getpid(), directory())
+    if _owner != owner:
+        os.makedirs(owner[1], exist_ok=True)
+        collect_dead_processes(owner[1])
+        _values = ProcessValues(os.path.join(owner[1], f'{owner[0]}.db'))
+        if _owner is None or _owner[0] != owner[0]:
+            Finalize(None, release_process_values, exitpriority=0)
+        _owner = owner
+    return _values
+
+
+def sample_key(name, labels):
+    return json.dumps([name, sorted(labels.items())], ensure_ascii=False)
+
+
+def inc(name, labels, amount=1):
+    with _lock:
+        process_values().add(sample_key(name, labels), amount)
+
+
+def observe(name, labels, value):
+    """Наблюдение гистограммы: корзины накопительные, как в Prometheus."""
+    buckets = METRICS[name][2]
+    with _lock:
+        values = process_values()
+        for bound in (*buckets, math.inf):
+            if value <= bound:
+                values.add(sample_key(
+                    f'{name}_bucket', {**labels, 'le': format_bound(bound)}
+                ), 1)
+        values.add(sample_key(f'{name}_sum', labels), value)
+        values.add(sample_key(f'{name}_count', labels), 1)
+
+
+def record_request(route, method, status, timing):
+    """Метрики ответа по его RequestTiming."""
+    route = route or ''
+    inc('yatube_requests_total', {
+        'route': route, 'method': method, 'status': str(status),
+    })
+    observe('yatube_request_duration_seconds', {'route': route},
+            timing.total)
+    observe('yatube_request_queries', {'route': route}, timing.queries)
+    for result, count in (
+        ('hit', timing.cache_hits), ('miss', timing.cache_misses)
+    ):
+        if count:
+            inc('yatube_cache_requests_total',
+                {'route': route, 'result': result}, count)
+
+
+def format_bound(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+def format_value(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"'
+        ).replace('\n', r'\n'))
+        for name, value in labels
+    ) + '}'
+
+
+def collect():
+    """Суммы значений всех процессов: {(имя, метки): значение}."""
+    totals = defaultdict(float)
+    with locked(directory(), exclusive=False):
+        for path in glob.glob(os.path.join(directory(), '*.db')):
+            try:
+                with open(path, 'rb') as file_:
+                    data = file_.read()
+            except FileNotFoundError:
+                continue
+            for key, _, value in entries(data):
+                name, labels = json.loads(key)
+                totals[name, tuple(map(tuple, labels))] += value
+    return totals
+
+
+def sample_order(sample):
+    """Пробы семейства: по меткам, затем корзины по le, _sum, _count."""
+    (name, labels), _ = sample
+    labels = dict(labels)
+    bound = labels.pop('le', None)
+    suffix = ('_bucket', '_sum', '_count')
+    rank = next(
+        (i for i, end in enumerate(suffix) if name.endswith(end)), 0
+    )
+    return (
+        sorted(labels.items()), rank,
+        math.inf if bound == '+Inf' else float(bound or 0),
+    )
+
+
+def family(name):
+    for end in ('_bucket', '_sum', '_count'):
+        if name.endswith(end) and name[:-len(end)] in METRICS:
+            return name[:-len(end)]
+    return name
+
+
+def ratios(name, samples, group, field, hits, counted):
+    """Доли проб со значением field из hits среди проб из counted
+    по значениям метки group.
+    """
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for (_, labels), value in samples:
+        labels = dict(labels)
+        if labels[field] in counted:
+            totals[labels[group]][0] += value
+            if labels[field] in hits:
+                totals[labels[group]][1] += value
+    return [
+        ((name, ((group, key),)), hit / total)
+        for key, (total, hit) in totals.items() if total
+    ]
+
+
+def exposition():
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    families = defaultdict(list)
+    for sample in collect().items():
+        families[family(sample[0][0])].append(sample)
+    families[HIT_RATIO] = ratios(
+        HIT_RATIO, families['yatube_cache_requests_total'],
+        'route', 'result', {'hit'}, {'hit', 'miss'},
+    )
+    families[L1_HIT_RATIO] = ratios(
+        L1_HIT_RATIO, families[TIER_REQUESTS],
+        'cache', 'level', {'l1'}, {'l1', 'l2', 'miss'},
+    )
+    families[L2_HIT_RATIO] = ratios(
+        L2_HIT_RATIO, families[TIER_REQUESTS],
+        'cache', 'level', {'l2'}, {'l2', 'miss'},
+    )
+    lines = []
+    for name, (kind, help_text, _) in (
+        *METRICS.items(),
+        *((name, ('gauge', help_text, None))
+          for name, help_text in GAUGES.items()),
+    ):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (sample, labels), value in sorted(
+            families[name], key=sample_order
+        ):
+            lines.append(
+                f'{sample}{format_labels(labels)} {format_value(value)}'
+            )
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class MediaFile(models.Model):
+    """Файл хранилища, названный по содержимому, и число ссылок на него."""
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return self.name
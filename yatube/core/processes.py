@@ -0,0 +1,36 @@
+"""Пулы процессов с настроенным Django.
+
+Процессы запускаются заново (spawn), а не через fork: так они не делят
+с родителем открытые соединения с базой. Работают они с теми же базами,
+что и родитель, в том числе с тестовыми. Модуль не импортирует моделей:
+его функцию-инициализатор новый процесс загружает раньше, чем
+вызывается django.setup().
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections
+
+
+def setup_django(settings_module, database_names):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+    for alias, name in database_names.items():
+        connections[alias].settings_dict['NAME'] = name
+
+
+def django_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=setup_django,
+        initargs=(
+            os.environ['DJANGO_SETTINGS_MODULE'],
+            {
+                connection.alias: connection.settings_dict['NAME']
+                for connection in connections.all()
+            },
+        ),
+    )
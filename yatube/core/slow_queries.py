@@ -0,0 +1,122 @@
+"""Журнал медленных запросов к базе.
+
+RequestTiming передаёт сюда запросы дольше SLOW_QUERY_THRESHOLD_MS.
+Запись - строка JSON в SLOW_QUERY_LOG: отпечаток запроса, его SQL
+без параметров, время, маршрут и view, выпустившие запрос, и план
+EXPLAIN QUERY PLAN. Строка дописывается одним write в файл, открытый
+на добавление, поэтому воркеры gunicorn пишут в общий файл, не мешая
+друг другу. Отчёт по журналу - manage.py slow_queries.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+# Литералы и параметры заменяются на ?, списки и строки VALUES - на (?+).
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),
+    (re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+'), '(?+)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def normalize(sql):
+    """SQL без значений: запросы, отличающиеся только ими, совпадают."""
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.blake2b(
+        normalize(sql).encode(), digest_size=8
+    ).hexdigest()
+
+
+def explain(connection, sql, params):
+    """План запроса строками или None, если план не получить."""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return [' '.join(map(str, row[3:] or row)) for row in cursor]
+    except DatabaseError:
+        return None
+
+
+def view_of(request):
+    """Имя маршрута и путь к функции view запроса."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None, None
+    view = getattr(match.func, 'view_class', match.func)
+    return match.view_name, f'{view.__module__}.{view.__qualname__}'
+
+
+def record(connection, sql, params, duration, request=None):
+    route, view = view_of(request)
+    entry = {
+        'time': timezone.now().isoformat(),
+        'fingerprint': fingerprint(sql),
+        'sql': normalize(sql),
+        'duration_ms': round(duration * 1000, 3),
+        'database': connection.alias,
+        'route': route,
+        'view': view,
+        'plan': explain(connection, sql, params),
+    }
+    logger.warning(
+        'Медленный запрос %s (%.1f мс) в %s: %s',
+        entry['fingerprint'], entry['duration_ms'], route, entry['sql'],
+    )
+    line = (json.dumps(entry, ensure_ascii=False) + '\n').encode()
+    try:
+        append(settings.SLOW_QUERY_LOG, line)
+    except OSError as error:
+        # Журнал не должен ронять запрос, который в него пишет.
+        logger.warning(
+            'Журнал медленных запросов %s недоступен: %s',
+            settings.SLOW_QUERY_LOG, error,
+        )
+    return entry
+
+
+def append(path, line):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def entries(path):
+    """Записи журнала; оборванные строки пропускаются."""
+    with open(path, encoding='utf-8') as lines:
+        for line in lines:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
@@ -0,0 +1,75 @@
+"""Хранилище медиафайлов, адресованных содержимым.
+
+Файл называется sha256 своего содержимого и лежит в каталогах
+по первым байтам хеша: posts/ab/cd/abcd….jpg. Одинаковые загрузки
+хранятся одним файлом, ссылки на него считает MediaFile.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import MediaFile
+
+HASHED_NAME = re.compile(
+    r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}(?:\.\w+)?$'
+)
+
+
+def content_name(name, digest):
+    """Имя файла с хешем digest в каталоге, куда просился name."""
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(
+        os.path.dirname(name), digest[:2], digest[2:4], digest + extension
+    )
+
+
+def is_content_name(name):
+    return HASHED_NAME.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который называет файлы по содержимому.
+
+    save() возвращает имя по хешу; если такой файл уже есть, он
+    не пишется заново, а получает ещё одну ссылку. release() снимает
+    ссылку и удаляет файл, когда ссылок не осталось. delete() удаляет
+    файл сразу, как у FileSystemStorage.
+    """
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        name = content_name(name, digest.hexdigest())
+        # Ссылка берётся раньше проверки файла: release() того же
+        # файла ждёт конца транзакции и не удалит его из-под записи.
+        with transaction.atomic():
+            media, _ = MediaFile.objects.get_or_create(name=name)
+            MediaFile.objects.filter(pk=media.pk).update(
+                references=F('references') + 1
+            )
+            if self.exists(name):
+                return name
+            return super()._save(name, content)
+
+    def release(self, name):
+        """Снимает ссылку на файл. True - ссылок не осталось, файл удалён.
+
+        Файлы без MediaFile (сохранённые до этого хранилища) не трогает.
+        """
+        with transaction.atomic():
+            if MediaFile.objects.filter(
+                name=name, references__gt=1
+            ).update(references=F('references') - 1):
+                return False
+            deleted, _ = MediaFile.objects.filter(name=name).delete()
+            if not deleted:
+                return False
+            self.delete(name)
+        return True
@@ -2,7 +2,19 @@ from django import template
 
 register = template.Library()
 
+# Сколько номеров страниц показывать по обе стороны от текущей.
+PAGE_WINDOW = 3
+
 
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+@register.filter
+def page_window(page, size=PAGE_WINDOW):
+    """Номера страниц вокруг текущей вместо всего page_range."""
+    return range(
+        max(1, page.number - size),
+        min(page.paginator.num_pages, page.number + size) + 1
+    )
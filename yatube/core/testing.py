@@ -0,0 +1,62 @@
+"""Тесты работают со своим каталогом состояния.
+
+Общий кеш в файле, метрики процессов и журнал медленных запросов
+у тестов свои, во временном каталоге: запуск тестов на хосте не стирает
+кеш сайта и не добавляет запросов в его метрики.
+Каталог передаётся и процессам пулов через YATUBE_STATE_DIR.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+STATE_BACKENDS = ('core.cache.MmapCache',)
+
+
+def state_settings(directory):
+    """Настройки, которые кладут файлы состояния в directory."""
+    caches = {}
+    for alias, params in settings.CACHES.items():
+        if params['BACKEND'] in STATE_BACKENDS:
+            params = {**params, 'LOCATION': os.path.join(
+                directory, os.path.basename(params['LOCATION'])
+            )}
+        caches[alias] = params
+    return {
+        'CACHES': caches,
+        'METRICS_DIR': os.path.join(directory, 'metrics'),
+        'SLOW_QUERY_LOG': os.path.join(directory, 'slow-queries.jsonl'),
+    }
+
+
+class TemporaryState:
+    """Временный каталог состояния на время запуска тестов."""
+
+    def start(self):
+        self.directory = tempfile.mkdtemp(prefix='yatube-test-')
+        self.previous = os.environ.get('YATUBE_STATE_DIR')
+        os.environ['YATUBE_STATE_DIR'] = self.directory
+        self.override = override_settings(**state_settings(self.directory))
+        self.override.enable()
+
+    def stop(self):
+        self.override.disable()
+        if self.previous is None:
+            os.environ.pop('YATUBE_STATE_DIR', None)
+        else:
+            os.environ['YATUBE_STATE_DIR'] = self.previous
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class StateDirRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.state = TemporaryState()
+        self.state.start()
+
+    def teardown_test_environment(self, **kwargs):
+        self.state.stop()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import WAYS, MmapCache, TieredCache
+from ..metrics import TIER_REQUESTS, collect, exposition
+from .test_metrics import temporary_metrics
+
+SLOT_SIZE = 256
+INCREMENTS = 200
+WORKERS = 4
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'tiered-tests',
+        'OPTIONS': {
+            'L2': 'l2',
+            'L1_MAX_ENTRIES': 2,
+            'VOLATILE_PREFIXES': ('generation:',),
+        },
+    },
+    'l2': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-tests-l2',
+    },
+}
+
+
+def increment(cache):
+    for _ in range(INCREMENTS):
+        cache.incr('counter')
+
+
+class MmapCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return MmapCache(
+            os.path.join(self.directory, 'cache'), {'OPTIONS': options}
+        )
+
+    def test_set_get_delete(self):
+        """Значения сохраняются, перезаписываются и удаляются"""
+        self.cache.set('key', {'a': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'a': [1, 2]})
+        self.cache.set('key', 'x' * 5000)
+        self.assertEqual(self.cache.get('key'), 'x' * 5000)
+        self.assertTrue(self.cache.delete('key'))
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_add_touch_and_expiry(self):
+        """add не перезаписывает, просроченные записи не видны"""
+        self.assertTrue(self.cache.add('key', 1, 0.2))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+        time.sleep(0.3)
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('key', 3, 0.2)
+        self.assertTrue(self.cache.touch('key', None))
+        time.sleep(0.3)
+        self.assertEqual(self.cache.get('key'), 3)
+
+    def test_incr_and_clear(self):
+        """incr сдвигает число, clear стирает все записи"""
+        with self.assertRaises(ValueError):
+            self.cache.incr('counter')
+        self.cache.set('counter', 10)
+        self.assertEqual(self.cache.incr('counter', 5), 15)
+        self.assertEqual(self.cache.decr('counter'), 14)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('counter'))
+
+    def test_lru_eviction(self):
+        """Переполненный набор вытесняет давно не читанный ключ"""
+        cache = self.make_cache(
+            SLAB_SIZES=(SLOT_SIZE,), MAX_SIZE=SLOT_SIZE * WAYS
+        )
+        for i in range(WAYS):
+            cache.set(f'key{i}', i)
+        cache.get('key0')
+        cache.set('extra', 'value')
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertIsNone(cache.get('key1'))
+        self.assertEqual(cache.get('extra'), 'value')
+
+    def test_too_large_value_not_stored(self):
+        """Значение больше самого крупного слота не кешируется"""
+        cache = self.make_cache(SLAB_SIZES=(SLOT_SIZE,))
+        cache.set('key', 'small')
+        cache.set('key', 'x' * SLOT_SIZE)
+        self.assertIsNone(cache.get('key'))
+
+    def test_foreign_files_rejected(self):
+        """Ссылка и файл, открытый группе и остальным, не читаются"""
+        target = os.path.join(self.directory, 'target')
+        link = os.path.join(self.directory, 'link')
+        os.symlink(target, link)
+        shared = os.path.join(self.directory, 'shared')
+        with open(shared, 'wb'):
+            pass
+        os.chmod(shared, 0o644)
+        for path, error in ((link, OSError), (shared, PermissionError)):
+            with self.subTest(path=path):
+                with self.assertRaises(error):
+                    MmapCache(path, {}).get('key')
+        self.assertFalse(os.path.exists(target))
+
+    def test_shared_between_processes(self):
+        """Процессы видят записи друг друга, incr атомарен между ними"""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.make_cache(),))
+            for _ in range(WORKERS)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), WORKERS * INCREMENTS)
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.l2 = caches['l2']
+        self.cache.clear()
+
+    def test_read_through_and_write_through(self):
+        """Запись идёт в оба уровня, промах L1 дочитывается из L2"""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.l2.get('key'), 'value')
+        self.l2.set('other', 'from l2')
+        self.assertEqual(self.cache.get('other'), 'from l2')
+        self.l2.delete('other')
+        self.assertEqual(self.cache.get('other'), 'from l2')
+
+    def test_l1_is_bounded_and_expires(self):
+        """L1 держит не больше L1_MAX_ENTRIES записей и L1_TIMEOUT секунд"""
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.l2.clear()
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'b': 'b', 'c': 'c'}
+        )
+        cache = TieredCache('tiered-expiry', {'OPTIONS': {
+            'L2': 'l2', 'L1_TIMEOUT': 0.1,
+        }})
+        cache.set('key', 'value')
+        self.l2.delete('key')
+        time.sleep(0.2)
+        self.assertIsNone(cache.get('key'))
+
+    def test_volatile_keys_skip_l1(self):
+        """Поколения читаются из L2 и меняются сразу"""
+        self.cache.set('generation:index', 1)
+        self.l2.incr('generation:index')
+        self.assertEqual(self.cache.get('generation:index'), 2)
+        self.assertEqual(self.cache.incr('generation:index'), 3)
+
+    def test_writes_drop_l1(self):
+        """incr и delete убирают устаревшую запись из L1"""
+        self.cache.set('counter', 1)
+        self.cache.incr('counter')
+        self.assertEqual(self.cache.get('counter'), 2)
+        self.cache.delete('counter')
+        self.assertIsNone(self.cache.get('counter'))
+
+    def test_get_many_batches_l2(self):
+        """get_many добирает промахи L1 одним вызовом L2"""
+        self.cache.set('a', 1)
+        self.l2.set('b', 2)
+        with mock.patch.object(
+            self.l2, 'get_many', wraps=self.l2.get_many
+        ) as get_many:
+            self.assertEqual(
+                self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2}
+            )
+        get_many.assert_called_once_with(['b', 'c'], version=None)
+
+    def tier_requests(self):
+        totals = collect()
+        return [
+            totals.get((TIER_REQUESTS, (
+                ('cache', 'tiered-tests'), ('level', level)
+            )), 0)
+            for level in ('l1', 'l2', 'miss')
+        ]
+
+    def test_stats(self):
+        """Чтения L1, L2 и промахи идут в метрики, доли - на /metrics"""
+        temporary_metrics(self)
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        self.l2.set('other', 'value')
+        self.cache.get('other')
+        self.cache.get('missing')
+        self.cache.get_many(['key', 'missing'])
+        self.assertEqual(self.tier_requests(), [2, 1, 2])
+        text = exposition()
+        for line in (
+            'yatube_cache_l1_hit_ratio{cache="tiered-tests"} 0.4',
+            'yatube_cache_l2_hit_ratio{cache="tiered-tests"} '
+            + repr(1 / 3),
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line + '\n', text)
+
+    def test_stats_add_up_across_processes(self):
+        """Чтения воркеров складываются в общие метрики"""
+        temporary_metrics(self)
+        self.cache.set('key', 'value')
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=self.cache.get, args=('key',))
+            for _ in range(WORKERS)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.tier_requests(), [WORKERS, 0, 0])
+
+    def test_volatile_stats(self):
+        """Чтения поколений из L2 тоже считаются попаданиями и промахами"""
+        temporary_metrics(self)
+        self.cache.set('generation:index', 1)
+        self.cache.get('generation:index')
+        self.cache.get('generation:missing')
+        self.cache.get_many(['generation:index', 'generation:other'])
+        self.assertEqual(self.tier_requests(), [0, 2, 2])
@@ -0,0 +1,202 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from .. import metrics
+from ..metrics import (
+    AGGREGATE, LOCK, ProcessValues, collect, exposition, inc, observe,
+    sample_key
+)
+
+INCREMENTS = 500
+WORKERS = 4
+METRICS_URL = reverse('metrics')
+
+
+def increment():
+    for _ in range(INCREMENTS):
+        inc('yatube_requests_total', {'route': 'worker'})
+
+
+def temporary_metrics(test):
+    """Свой каталог метрик на время теста."""
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory)
+    override = override_settings(METRICS_DIR=directory)
+    override.enable()
+    test.addCleanup(override.disable)
+    return directory
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = temporary_metrics(self)
+
+    def test_process_values_persist(self):
+        """Значения переживают переоткрытие файла, файл растёт"""
+        path = os.path.join(self.directory, 'values.db')
+        values = ProcessValues(path)
+        for i in range(5000):
+            values.add(f'key{i}', i)
+        values.add('key1', 0.5)
+        reopened = ProcessValues(path)
+        reopened.add('key2', 1)
+        self.assertEqual(
+            {key: value for key, _, value in metrics.entries(
+                open(path, 'rb').read()
+            ) if key in ('key1', 'key2', 'key4999')},
+            {'key1': 1.5, 'key2': 3.0, 'key4999': 4999.0},
+        )
+
+    def test_histogram(self):
+        """Корзины накопительные, есть _sum и _count"""
+        for value in (0.003, 0.2, 20):
+            observe('yatube_request_duration_seconds', {'route': 'r'}, value)
+        text = exposition()
+        for line in (
+            '# TYPE yatube_request_duration_seconds histogram',
+            'yatube_request_duration_seconds_bucket{le="0.005",route="r"} 1',
+            'yatube_request_duration_seconds_bucket{le="0.25",route="r"} 2',
+            'yatube_request_duration_seconds_bucket{le="10.0",route="r"} 2',
+            'yatube_request_duration_seconds_bucket{le="+Inf",route="r"} 3',
+            'yatube_request_duration_seconds_sum{route="r"} 20.203',
+            'yatube_request_duration_seconds_count{route="r"} 3',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line + '\n', text)
+        buckets = [
+            line for line in text.splitlines()
+            if line.startswith('yatube_request_duration_seconds_bucket')
+        ]
+        self.assertTrue(buckets[-1].startswith(
+            'yatube_request_duration_seconds_bucket{le="+Inf"'
+        ))
+
+    def test_labels_escaped(self):
+        """Кавычки и переводы строк в метках экранируются"""
+        inc('yatube_requests_total', {'route': 'a"b\nc'})
+        self.assertIn(
+            'yatube_requests_total{route="a\\"b\\nc"} 1\n', exposition()
+        )
+
+    def test_hit_ratio(self):
+        """Доля попаданий считается по сумме счётчиков кеша"""
+        inc('yatube_cache_requests_total', {'route': 'r', 'result': 'hit'}, 3)
+        inc('yatube_cache_requests_total', {'route': 'r', 'result': 'miss'})
+        self.assertIn('yatube_cache_hit_ratio{route="r"} 0.75\n', exposition())
+
+    def test_threads(self):
+        """Потоки одного процесса не теряют приращений"""
+        threads = [
+            threading.Thread(target=increment) for _ in range(WORKERS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            collect()['yatube_requests_total', (('route', 'worker'),)],
+            INCREMENTS * WORKERS,
+        )
+
+    def test_processes(self):
+        """Значения процессов складываются, завершившиеся процессы
+        сливают свои файлы в aggregate.db"""
+        inc('yatube_requests_total', {'route': 'worker'})
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=increment) for _ in range(WORKERS)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(
+            set(os.listdir(self.directory)),
+            {f'{os.getpid()}.db', AGGREGATE, LOCK},
+        )
+        self.assertEqual(
+            collect()['yatube_requests_total', (('route', 'worker'),)],
+            INCREMENTS * WORKERS + 1,
+        )
+
+    def test_dead_processes_collected(self):
+        """Файл процесса, умершего без слияния, сливается при старте"""
+        process = multiprocessing.get_context('fork').Process(
+            target=os._exit, args=(0,)
+        )
+        process.start()
+        process.join()
+        dead = os.path.join(self.directory, f'{process.pid}.db')
+        values = ProcessValues(dead)
+        values.add(sample_key('yatube_requests_total', {'route': 'dead'}), 2)
+        values.close()
+        with mock.patch.object(metrics, '_owner', None):
+            inc('yatube_requests_total', {'route': 'dead'})
+        self.assertFalse(os.path.exists(dead))
+        self.assertEqual(
+            collect()['yatube_requests_total', (('route', 'dead'),)], 3
+        )
+
+
+class MetricsEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Post.objects.create(
+            author=User.objects.create_user(username='author'), text='Пост'
+        )
+
+    def setUp(self):
+        temporary_metrics(self)
+        cache.clear()
+
+    def test_request_metrics(self):
+        """Ответы попадают в счётчики и гистограммы маршрута"""
+        client = Client()
+        client.get(reverse('posts:index'))
+        client.get(reverse('posts:index'))
+        response = client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith(
+            'text/plain; version=0.0.4'
+        ))
+        text = response.content.decode()
+        for line in (
+            'yatube_requests_total{method="GET",route="posts:index",'
+            'status="200"} 2',
+            'yatube_request_duration_seconds_count{route="posts:index"} 2',
+            'yatube_request_queries_bucket{le="+Inf",route="posts:index"} 2',
+            'yatube_cache_requests_total{result="miss",route="posts:index"}',
+            'yatube_cache_hit_ratio{route="posts:index"}',
+            '# TYPE yatube_thumbnail_duration_seconds histogram',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text)
+
+    def test_forbidden_address(self):
+        """Чужим адресам метрики не отдаются"""
+        response = Client(REMOTE_ADDR='10.0.0.1').get(METRICS_URL)
+        self.assertEqual(response.status_code, 403)
+
+
+class StateDirTests(SimpleTestCase):
+    def test_tests_use_temporary_state(self):
+        """Тесты пишут кеш, метрики и журнал во временный каталог"""
+        directory = os.environ['YATUBE_STATE_DIR']
+        self.assertNotEqual(directory, settings.STATE_DIR)
+        for path in (
+            settings.CACHES['shared']['LOCATION'], settings.METRICS_DIR,
+            settings.SLOW_QUERY_LOG,
+        ):
+            with self.subTest(path=path):
+                self.assertTrue(path.startswith(directory + os.sep))
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..slow_queries import entries, fingerprint, normalize
+
+MAIN_URL = reverse('posts:index')
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_values_ignored(self):
+        """Запросы, отличающиеся значениями, получают один отпечаток"""
+        cases = [
+            ('SELECT * FROM "posts_post" WHERE "id" = 1 LIMIT 10',
+             'SELECT * FROM "posts_post" WHERE "id" = 25 LIMIT 20'),
+            ('SELECT * FROM "t" WHERE "id" IN (%s, %s)',
+             'SELECT * FROM "t"   WHERE "id" IN (%s)'),
+            ("SELECT * FROM \"t\" WHERE \"text\" = 'it''s'",
+             'SELECT * FROM "t" WHERE "text" = %s'),
+            ('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)',
+             'INSERT INTO "t" ("a", "b") VALUES (%s, %s)'),
+        ]
+        for first, second in cases:
+            with self.subTest(sql=first):
+                self.assertEqual(fingerprint(first), fingerprint(second))
+
+    def test_structure_kept(self):
+        """Имена таблиц и полей с цифрами не заменяются"""
+        self.assertEqual(
+            normalize('SELECT "t0"."col1" FROM "t0" WHERE "t0"."a" > -5'),
+            'SELECT "t0"."col1" FROM "t0" WHERE "t0"."a" > ?',
+        )
+        self.assertNotEqual(
+            fingerprint('SELECT * FROM "posts_post"'),
+            fingerprint('SELECT * FROM "posts_group"'),
+        )
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Post.objects.create(
+            author=User.objects.create_user(username='author'), text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'slow.jsonl')
+
+    def get(self, threshold):
+        with override_settings(
+            SLOW_QUERY_THRESHOLD_MS=threshold, SLOW_QUERY_LOG=self.path
+        ):
+            return Client().get(MAIN_URL)
+
+    def test_slow_queries_logged(self):
+        """Запросы дольше порога - в журнале с планом и маршрутом"""
+        with self.assertLogs('core.slow_queries', 'WARNING'):
+            response = self.get(0)
+        logged = list(entries(self.path))
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertEqual(len(logged), 2)
+        for entry in logged:
+            with self.subTest(sql=entry['sql']):
+                self.assertEqual(entry['route'], 'posts:index')
+                self.assertEqual(entry['view'], 'posts.views.index')
+                self.assertEqual(entry['fingerprint'], fingerprint(
+                    entry['sql']
+                ))
+                self.assertTrue(entry['plan'])
+
+    def test_unwritable_log(self):
+        """Недоступный журнал не ломает ответ, ошибка уходит в лог"""
+        with open(self.path, 'w'):
+            pass
+        self.path = os.path.join(self.path, 'slow.jsonl')
+        with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            response = self.get(0)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('недоступен' in line for line in logs.output))
+
+    def test_fast_queries_skipped(self):
+        """Запросы быстрее порога не пишутся"""
+        self.get(10 ** 6)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class SlowQueriesCommandTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'slow.jsonl')
+        rows = [
+            ('SELECT * FROM t WHERE id = 1', 'posts:index', 100),
+            ('SELECT * FROM t WHERE id = 2', 'posts:index', 300),
+            ('SELECT * FROM t WHERE id = 3', 'posts:profile', 200),
+            ('SELECT * FROM u', 'posts:index', 150),
+        ]
+        with open(self.path, 'w', encoding='utf-8') as log:
+            for sql, route, duration in rows:
+                log.write(json.dumps({
+                    'fingerprint': fingerprint(sql), 'sql': normalize(sql),
+                    'duration_ms': duration, 'route': route,
+                    'plan': ['SCAN t'],
+                }) + '\n')
+            log.write('{"оборванная')
+
+    def report(self, **options):
+        out = StringIO()
+        call_command('slow_queries', self.path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_grouped_by_fingerprint(self):
+        """Записи сгруппированы, самый дорогой отпечаток первым"""
+        lines = self.report().splitlines()
+        self.assertEqual(lines[0], (
+            f'{fingerprint("SELECT * FROM t WHERE id = 1")}: 3 раз, '
+            'всего 600.0 мс, p50 200.0, p95 300.0, p99 300.0, max 300.0 мс'
+        ))
+        self.assertEqual(
+            lines[1], '  маршруты: posts:index (2), posts:profile (1)'
+        )
+        self.assertEqual(lines[3], '    SCAN t')
+        self.assertEqual(lines[-1], 'Отпечатков: 2, записей: 4.')
+
+    def test_route_filter(self):
+        """--route оставляет записи одного маршрута"""
+        self.assertIn(
+            'Отпечатков: 1, записей: 1.',
+            self.report(route='posts:profile'),
+        )
+
+    def test_missing_log(self):
+        """Без журнала - понятная ошибка"""
+        with self.assertRaises(CommandError):
+            call_command('slow_queries', self.path + '.missing')
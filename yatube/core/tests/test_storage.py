@@ -0,0 +1,64 @@
+import hashlib
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from ..models import MediaFile
+from ..storage import ContentAddressedStorage, content_name, is_content_name
+
+CONTENT = b'content'
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_name_by_content(self):
+        """Файл называется по sha256 в каталогах по первым байтам хеша"""
+        name = self.storage.save('posts/photo.JPG', ContentFile(CONTENT))
+        self.assertEqual(
+            name, f'posts/{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.jpg'
+        )
+        self.assertEqual(name, content_name('posts/photo.JPG', DIGEST))
+        self.assertTrue(is_content_name(name))
+        self.assertFalse(is_content_name('posts/photo.jpg'))
+        with self.storage.open(name) as file_:
+            self.assertEqual(file_.read(), CONTENT)
+
+    def test_duplicates_stored_once(self):
+        """Одинаковые загрузки - один файл и счётчик ссылок"""
+        names = {
+            self.storage.save(f'posts/{i}.jpg', ContentFile(CONTENT))
+            for i in range(3)
+        }
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(MediaFile.objects.get(name=name).references, 3)
+        self.assertEqual(
+            self.storage.listdir(f'posts/{DIGEST[:2]}/{DIGEST[2:4]}')[1],
+            [f'{DIGEST}.jpg']
+        )
+
+    def test_release(self):
+        """Файл удаляется, когда отпущена последняя ссылка"""
+        name = self.storage.save('posts/a.jpg', ContentFile(CONTENT))
+        self.storage.save('posts/b.jpg', ContentFile(CONTENT))
+        self.assertFalse(self.storage.release(name))
+        self.assertTrue(self.storage.exists(name))
+        self.assertTrue(self.storage.release(name))
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_release_keeps_unknown_files(self):
+        """Файлы, сохранённые не этим хранилищем, release не удаляет"""
+        with open(f'{self.directory}/legacy.jpg', 'wb') as file_:
+            file_.write(CONTENT)
+        self.assertFalse(self.storage.release('legacy.jpg'))
+        self.assertTrue(self.storage.exists('legacy.jpg'))
@@ -0,0 +1,79 @@
+import json
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..timing import RequestTiming, _current
+
+MAIN_URL = reverse('posts:index')
+
+
+class TimingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, url):
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self.client.get(url)
+        return response, json.loads(logs.records[-1].getMessage())
+
+    def test_server_timing_header(self):
+        """Заголовок Server-Timing со всеми метриками"""
+        response, record = self.get(MAIN_URL)
+        metrics = {
+            metric.split(';')[0]: metric
+            for metric in response['Server-Timing'].split(', ')
+        }
+        self.assertEqual(
+            set(metrics), {'db', 'render', 'cache', 'total'}
+        )
+        self.assertIn(f'desc="{record["queries"]} queries"', metrics['db'])
+
+    def test_log_line(self):
+        """Строка лога с маршрутом, статусом и стоимостью запроса"""
+        with self.assertNumQueries(2):
+            response, record = self.get(MAIN_URL)
+        self.assertEqual(record['route'], 'posts:index')
+        self.assertEqual(record['method'], 'GET')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], 2)
+        self.assertGreater(record['render_ms'], 0)
+        self.assertGreaterEqual(record['total_ms'], record['render_ms'])
+
+    def test_cache_hits_and_misses(self):
+        """Промахи кеша на холодной странице, попадания на тёплой"""
+        _, cold = self.get(MAIN_URL)
+        _, warm = self.get(MAIN_URL)
+        self.assertGreater(cold['cache_misses'], 0)
+        self.assertGreater(warm['cache_hits'], 0)
+        self.assertLess(warm['queries'], cold['queries'])
+
+    def test_unresolved_url(self):
+        """Ненайденный адрес логируется без маршрута"""
+        response, record = self.get('/no/such/page/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(record['route'])
+
+    def test_nested_render_counted_once(self):
+        """Вложенный рендеринг не удваивает время шаблонов"""
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            render_to_string('core/404.html')
+            first = timing.render
+            timing.rendering = True
+            render_to_string('core/404.html')
+        finally:
+            _current.reset(token)
+        self.assertGreater(first, 0)
+        self.assertEqual(timing.render, first)
@@ -0,0 +1,152 @@
+"""Стоимость запроса в проде: запросы к базе, рендеринг шаблонов,
+обращения к кешу и общее время.
+
+TimingMiddleware собирает их в RequestTiming текущего запроса и отдаёт
+заголовком Server-Timing, JSON-строкой в лог core.timing (уровень INFO)
+с именем маршрута и в метрики core.metrics; медленные запросы к базе
+уходят в журнал core.slow_queries. Счёт - пара perf_counter на запрос
+к базе и на шаблон, поэтому middleware можно не выключать.
+"""
+import json
+import logging
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+
+from . import metrics, slow_queries
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    __slots__ = ('request', 'queries', 'db', 'render', 'rendering',
+                 'explaining', 'cache_hits', 'cache_misses', 'total')
+
+    def __init__(self, request=None):
+        self.request = request
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.rendering = False
+        self.explaining = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.total = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper: число и время запросов,
+        медленные - в журнал с планом.
+        """
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - started
+            self.db += duration
+            self.queries += 1
+        if not many and duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+            # Запрос плана сам проходит через эту обёртку.
+            self.explaining = True
+            try:
+                slow_queries.record(
+                    context['connection'], sql, params, duration,
+                    self.request,
+                )
+            finally:
+                self.explaining = False
+        return result
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'render;dur={self.render * 1000:.1f}',
+            f'cache;desc="hits={self.cache_hits} '
+            f'misses={self.cache_misses}"',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db * 1000, 1),
+            'render_ms': round(self.render * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'total_ms': round(self.total * 1000, 1),
+        }
+
+
+def count_cache(hits=0, misses=0):
+    """Попадания и промахи кеша в счёт текущего запроса."""
+    timing = _current.get()
+    if timing is not None:
+        timing.cache_hits += hits
+        timing.cache_misses += misses
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        # Вложенный render_to_string уже входит во время внешнего.
+        if timing is None or timing.rendering:
+            return super().render(context, request)
+        timing.rendering = True
+        started = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.render += perf_counter() - started
+            timing.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Бэкенд шаблонов Django, который засекает время рендеринга."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
+
+
+class TimingMiddleware:
+    """Ставится первым, чтобы в счёт вошли и остальные middleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = RequestTiming(request)
+        token = _current.set(timing)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timing.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        timing.total = perf_counter() - started
+        response['Server-Timing'] = timing.server_timing()
+        match = request.resolver_match
+        route = match.view_name if match else None
+        metrics.record_request(
+            route, request.method, response.status_code, timing
+        )
+        logger.info(json.dumps({
+            'route': route,
+            'method': request.method,
+            'status': response.status_code,
+            **timing.as_dict(),
+        }))
+        return response
@@ -1,9 +1,79 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import Now
+from django.utils.functional import cached_property
 
+from .counters import change_feed_counts, group_feed
 from .models import Post, Group, Comment, Follow
+from .search import match_expression, matching_ids
+from .settings import APPROXIMATE_COUNT_FROM
+from .signals import touch_post_feeds
 
 
-class PostAdmin(admin.ModelAdmin):
+class ApproximateCountPaginator(Paginator):
+    """Оценивает число строк большой таблицы без полного COUNT(*).
+
+    Весь список оценивается разбросом первичных ключей - два шага по
+    индексу. Оценка не меньше настоящего числа строк, поэтому страницы
+    не теряются, последние могут оказаться пустыми. Отфильтрованный
+    список и таблица меньше APPROXIMATE_COUNT_FROM строк считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        rows = self.object_list.order_by()
+        if rows.query.where:
+            return rows.count()
+        span = rows.aggregate(low=Min('pk'), high=Max('pk'))
+        if span['low'] is None:
+            return 0
+        estimate = span['high'] - span['low'] + 1
+        if estimate < APPROXIMATE_COUNT_FROM:
+            return rows.count()
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.only('title'), required=False, label='Группа',
+        empty_label='без группы',
+    )
+
+
+@transaction.atomic
+def move_posts_to_group(posts, group_id):
+    """Переносит посты в группу одним UPDATE и правит то, что
+    при сохранении по одному сделали бы сигналы: счётчики и поколения
+    лент. Возвращает число перенесённых постов.
+    """
+    posts = posts.exclude(Q(group_id=group_id) if group_id else Q(
+        group_id__isnull=True
+    ))
+    moved = list(posts.order_by().values('author_id', 'group_id').annotate(
+        count=Count('id')
+    ))
+    count = posts.update(group_id=group_id, updated=Now())
+    for row in moved:
+        if row['group_id'] is not None:
+            change_feed_counts([group_feed(row['group_id'])], -row['count'])
+        touch_post_feeds(row['author_id'], group_id, row['group_id'])
+    if group_id is not None:
+        change_feed_counts([group_feed(group_id)], count)
+    return count
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,42 +81,68 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    autocomplete_fields = ('author', 'group')
+    action_form = PostActionForm
+    actions = ('move_to_group',)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по тексту идёт по индексу FTS5, а не LIKE по таблице."""
+        match = match_expression(search_term)
+        if not match:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(pk__in=matching_ids(match)), False
+
+    def move_to_group(self, request, queryset):
+        try:
+            group = PostActionForm.base_fields['group'].clean(
+                request.POST.get('group')
+            )
+        except ValidationError:
+            self.message_user(request, 'Нет такой группы.', messages.ERROR)
+            return
+        count = move_posts_to_group(queryset, group.id if group else None)
+        self.message_user(request, f'Перенесено постов: {count}.')
+    move_to_group.short_description = 'Перенести в выбранную группу'
 
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'title',
         'description',
     )
     list_editable = ('title',)
-    search_fields = ('description',)
+    search_fields = ('title', 'description')
     list_filter = ('title',)
-    empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
         'post',
+        'author',
+        'created',
     )
+    list_select_related = ('post', 'author')
     search_fields = ('text',)
-    list_filter = ('text',)
-    empty_value_display = '-пусто-'
+    list_filter = ('created',)
+    autocomplete_fields = ('post', 'author')
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'user',
         'author',
     )
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
 
 
 admin.site.register(Post, PostAdmin)
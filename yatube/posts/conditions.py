@@ -0,0 +1,94 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .counters import INDEX_FEED, author_feed, follow_feed, group_feed
+from .generations import feed_generation
+from .models import Group, Post, Profile
+from .settings import PUBLIC_CACHE_MAX_AGE
+
+
+# Ленты не отдают Last-Modified: дата нового поста не меняется при
+# правке и удалении. Валидатор ленты - её поколение в ETag, а для
+# страниц группы и автора ещё и поля шапки: их правят в админке,
+# не трогая поколение.
+def index_state(request):
+    return None, (feed_generation(INDEX_FEED),)
+
+
+def group_state(request, slug):
+    group = Group.objects.filter(slug=slug).values_list(
+        'id', 'title', 'description'
+    ).first()
+    if group is None:
+        return None, None
+    return None, (feed_generation(group_feed(group[0])), *group)
+
+
+def profile_state(request, username):
+    counters = Profile.objects.filter(user__username=username).values_list(
+        'user_id', 'posts_count', 'followers_count', 'following_count',
+        'user__username', 'user__first_name', 'user__last_name',
+    ).first()
+    if counters is None:
+        return None, None
+    parts = (feed_generation(author_feed(counters[0])), *counters)
+    if request.user.is_authenticated:
+        # Кнопка подписки: подписка сдвигает поколение ленты зрителя.
+        parts += (feed_generation(follow_feed(request.user.id)),)
+    return None, parts
+
+
+def post_state(request, post_id):
+    post = Post.objects.filter(id=post_id).values_list(
+        'updated', 'comments_count', 'author__profile__posts_count'
+    ).first()
+    if post is None:
+        return None, None
+    return post[0], post[1:]
+
+
+def conditional_page(state_func):
+    """Отвечает 304 по ETag/Last-Modified до рендера страницы.
+
+    state_func(request, *args, **kwargs) возвращает дату изменения
+    (или None) и кортеж частей валидатора; считается один раз на запрос.
+    ETag учитывает и зрителя: шапка и кнопки страницы зависят от
+    пользователя.
+    Анонимные ответы помечаются public, чтобы их мог отдавать прокси.
+    """
+    def state(request, *args, **kwargs):
+        if not hasattr(request, 'page_state'):
+            request.page_state = state_func(request, *args, **kwargs)
+        return request.page_state
+
+    def etag(request, *args, **kwargs):
+        parts = state(request, *args, **kwargs)[1]
+        if parts is None:
+            return None
+        return hashlib.md5(
+            repr((*parts, request.user.id)).encode()
+        ).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        return state(request, *args, **kwargs)[0]
+
+    def decorator(view):
+        conditional_view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, max_age=0)
+            else:
+                patch_cache_control(
+                    response, public=True, max_age=0,
+                    s_maxage=PUBLIC_CACHE_MAX_AGE,
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
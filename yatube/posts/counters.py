@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.functions import Greatest, Now
+
+from .models import Post, Profile
+from .settings import (
+    APPROXIMATE_COUNT_FROM, APPROXIMATE_COUNT_TIMEOUT, FEED_COUNT_TIMEOUT
+)
+
+INDEX_FEED = ('index',)
+
+
+def group_feed(group_id):
+    return ('group', group_id)
+
+
+def author_feed(author_id):
+    return ('author', author_id)
+
+
+def follow_feed(user_id):
+    return ('follow', user_id)
+
+
+def post_feeds(author_id, group_id):
+    """Ленты, в которые попадает пост, кроме лент подписчиков."""
+    feeds = [INDEX_FEED, author_feed(author_id)]
+    if group_id is not None:
+        feeds.append(group_feed(group_id))
+    return feeds
+
+
+def feed_count_key(feed):
+    return 'feed_count:' + ':'.join(map(str, feed))
+
+
+def feed_count(feed, posts):
+    """Число постов ленты из кеша, при промахе - из базы.
+
+    Счёт ограничен APPROXIMATE_COUNT_FROM записями, так что для очень
+    больших лент это нижняя граница, а не полный проход по таблице.
+    """
+    key = feed_count_key(feed)
+    count = cache.get(key)
+    if count is None:
+        count = posts[:APPROXIMATE_COUNT_FROM].count()
+        cache.set(key, count, (
+            APPROXIMATE_COUNT_TIMEOUT if count >= APPROXIMATE_COUNT_FROM
+            else FEED_COUNT_TIMEOUT
+        ))
+    return count
+
+
+def change_feed_counts(feeds, delta):
+    """Сдвигает закешированные счётчики лент на delta."""
+    for feed in feeds:
+        try:
+            cache.incr(feed_count_key(feed), delta)
+        except ValueError:
+            # Счётчика нет в кеше - его посчитают при следующем чтении.
+            pass
+
+
+def change_profile_counts(user_id, **deltas):
+    """Атомарно сдвигает счётчики профиля: posts_count=1 и т.п."""
+    Profile.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(id=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0),
+        updated=Now(),
+    )
@@ -0,0 +1,192 @@
+"""Поиск медиафайлов, на которые больше ничего не ссылается.
+
+Файлы обходятся в лексикографическом порядке полных путей, поэтому
+обход можно продолжить с любого пути; путь, на котором остановился
+прошлый запуск, хранится в файле MEDIA_GARBAGE_CURSOR. Живость
+проверяется пачками: картинки и их уменьшенные копии - по индексу
+Post.image и ссылкам MediaFile, миниатюры - по записям kvstore.
+"""
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from sorl.thumbnail import default
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.models import MediaFile
+
+from .models import Post
+from .settings import MEDIA_GARBAGE_CURSOR
+
+VARIANT = re.compile(r'^(?P<root>.+)_\d+w\.\w+$')
+
+
+def media_roots():
+    """Каталоги хранилища, где лежат картинки постов и миниатюры."""
+    return sorted({
+        Post.image.field.upload_to.rstrip('/'),
+        sorl_settings.THUMBNAIL_PREFIX.rstrip('/'),
+    })
+
+
+def walk(storage, directory, after=''):
+    """Пути файлов каталога больше after, по возрастанию."""
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    # Каталог сортируется как путь с косой чертой - так порядок обхода
+    # совпадает с порядком полных путей.
+    entries = sorted(
+        [(f'{directory}/{name}/', True) for name in directories]
+        + [(f'{directory}/{name}', False) for name in files]
+    )
+    for path, is_directory in entries:
+        if not is_directory:
+            if path > after:
+                yield path
+        elif path > after or after.startswith(path):
+            yield from walk(storage, path.rstrip('/'), after)
+
+
+def is_fresh(storage, name, min_age):
+    """Файл моложе min_age секунд: пост с ним может быть ещё
+    не записан в базу.
+    """
+    try:
+        return time.time() - os.path.getmtime(storage.path(name)) < min_age
+    except OSError:
+        return True
+
+
+def image_root(name):
+    return os.path.splitext(name)[0]
+
+
+def names_condition(field, names, roots):
+    """Условие на поле field: имя из names или любое имя root.*."""
+    condition = Q(**{f'{field}__in': names})
+    for root in roots:
+        # Диапазон вместо startswith: LIKE не идёт по индексу, а все
+        # имена root.* лежат между root. и root/.
+        condition |= Q(**{
+            f'{field}__gte': f'{root}.', f'{field}__lt': f'{root}/',
+        })
+    return condition
+
+
+def unreferenced_images(names):
+    """Картинки и уменьшенные копии из names, на которые не ссылается
+    ни один пост и у которых нет ссылок в MediaFile: такую ссылку берёт
+    загрузка, пост которой ещё не записан. Два запроса на пачку.
+    """
+    roots = {
+        match['root'] for match in map(VARIANT.match, names) if match
+    }
+    images = set(Post.objects.filter(
+        names_condition('image', names, roots)
+    ).values_list('image', flat=True))
+    images.update(MediaFile.objects.filter(
+        names_condition('name', names, roots), references__gt=0
+    ).values_list('name', flat=True))
+    image_roots = set(map(image_root, images))
+    return [
+        name for name in names
+        if name not in images and not (
+            VARIANT.match(name) and VARIANT.match(name)['root'] in image_roots
+        )
+    ]
+
+
+def unregistered_thumbnails(names):
+    """Миниатюры из names без записи в kvstore: их исходник удалён."""
+    files = {
+        add_prefix(ImageFile(name, default.storage).key): name
+        for name in names
+    }
+    kvstore = default.kvstore
+    if isinstance(kvstore, cached_db_kvstore.KVStore):
+        registered = set(KVStoreModel.objects.filter(
+            key__in=files
+        ).values_list('key', flat=True))
+    else:
+        registered = {
+            key for key, name in files.items()
+            if kvstore.get(ImageFile(name, default.storage)) is not None
+        }
+    return [name for key, name in files.items() if key not in registered]
+
+
+def is_thumbnail(name):
+    return name.startswith(sorl_settings.THUMBNAIL_PREFIX)
+
+
+def unreferenced(names):
+    """Ненужные файлы пачки: картинки без постов и сироты-миниатюры."""
+    thumbnails = [name for name in names if is_thumbnail(name)]
+    images = [name for name in names if not is_thumbnail(name)]
+    return sorted(
+        (unreferenced_images(images) if images else [])
+        + (unregistered_thumbnails(thumbnails) if thumbnails else [])
+    )
+
+
+def cursor_path():
+    return os.path.join(settings.MEDIA_ROOT, MEDIA_GARBAGE_CURSOR)
+
+
+def read_cursor():
+    """Путь, после которого продолжать обход; '' - с начала."""
+    try:
+        with open(cursor_path(), encoding='utf-8') as file_:
+            return file_.read()
+    except FileNotFoundError:
+        return ''
+
+
+def save_cursor(cursor):
+    """Записывает курсор целиком: через временный файл и rename."""
+    path = cursor_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w', encoding='utf-8') as file_:
+        file_.write(cursor)
+    os.replace(temporary, path)
+
+
+def remove(storage, name):
+    """Удаляет файл вместе с записями о нём в MediaFile и kvstore.
+
+    Картинку и её копии не трогает, если на картинку появилась ссылка
+    в MediaFile. Строки блокируются до удаления файла, поэтому save()
+    хранилища дождётся его и запишет файл заново. True - файл удалён.
+    """
+    if is_thumbnail(name):
+        storage.delete(name)
+        return True
+    match = VARIANT.match(name)
+    root = match['root'] if match else image_root(name)
+    with transaction.atomic():
+        references = MediaFile.objects.select_for_update().filter(
+            name__gte=f'{root}.', name__lt=f'{root}/'
+        ).values_list('references', flat=True)
+        if any(references):
+            return False
+        storage.delete(name)
+        if match:
+            return True
+        MediaFile.objects.filter(name=name).delete()
+    # Ключ kvstore зависит от хранилища: картинка могла попасть туда
+    # и через хранилище поля, и через хранилище по умолчанию.
+    for source_storage in (storage, default.storage):
+        delete_thumbnails(ImageFile(name, source_storage), delete_file=False)
+    return True
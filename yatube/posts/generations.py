@@ -0,0 +1,79 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .counters import author_feed, follow_feed
+from .settings import FEED_GENERATION_TIMEOUT
+
+
+def generation_key(feed):
+    return 'feed_generation:' + ':'.join(map(str, feed))
+
+
+def feed_generation(feed):
+    """Текущее поколение ленты: меняется при каждой записи в неё.
+
+    Начальное значение берётся от времени, чтобы после вытеснения
+    ключа из кеша не вернуться к поколению, которое уже было.
+    """
+    key = generation_key(feed)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), FEED_GENERATION_TIMEOUT)
+        generation = cache.get(key)
+    return generation
+
+
+def feed_generations(feeds):
+    """Поколения нескольких лент одним get_many."""
+    keys = [generation_key(feed) for feed in feeds]
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, FEED_GENERATION_TIMEOUT)
+        generations.update(cache.get_many(missing))
+    return [generations.get(key) for key in keys]
+
+
+def feed_cache_key(feed):
+    """Ключ фрагмента ленты: её идентичность и поколение."""
+    return ':'.join(map(str, (*feed, feed_generation(feed))))
+
+
+def follow_feed_key(user_id, author_ids):
+    """Ключ фрагмента ленты подписок: поколение подписок читателя
+    и поколения лент авторов, на которых он подписан. Запись автора
+    сдвигает только поколение его ленты, а не лент подписчиков.
+    """
+    feed = follow_feed(user_id)
+    authors = hashlib.md5(repr(feed_generations(
+        [author_feed(id) for id in sorted(author_ids)]
+    )).encode()).hexdigest()
+    return ':'.join(map(str, (*feed, feed_generation(feed), authors)))
+
+
+def on_write(action):
+    """Выполняет action сразу и ещё раз после коммита транзакции.
+
+    Второй вызов не даёт читателю, взявшему новое поколение до коммита,
+    закрепить под ним фрагмент со старыми данными.
+    """
+    action()
+    transaction.on_commit(action)
+
+
+def bump_generations(feeds):
+    keys = [generation_key(feed) for feed in feeds]
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Поколения нет в кеше - новое начнётся со времени чтения.
+                pass
+    on_write(bump)
@@ -0,0 +1,235 @@
+import base64
+import hashlib
+import os
+import re
+from io import BytesIO
+
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageFilter, ImageOps
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from core.storage import is_content_name
+
+from .models import Post
+
+from .settings import (
+    IMAGE_MAX_BYTES, IMAGE_MAX_PIXELS, IMAGE_MAX_SIDE, IMAGE_QUALITY,
+    IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_WIDTHS, PLACEHOLDER_BLUR,
+    PLACEHOLDER_SIZE
+)
+
+HASH_CHUNK = 64 * 1024
+DESCRIPTION_FIELDS = (
+    'image_width', 'image_height', 'image_hash', 'image_placeholder'
+)
+# Ключи Image.info, которые PIL может записать обратно в файл.
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'photoshop', 'comment')
+
+
+def describe_image(image):
+    """Размеры, sha256 и размытая заглушка картинки поста.
+
+    None, если файл не открывается: такие посты рендерятся
+    без размеров и заглушки.
+    """
+    was_closed = image.closed
+    try:
+        image.open('rb')
+        try:
+            image.seek(0)
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: image.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+            image.seek(0)
+            picture = Image.open(image)
+            picture.load()
+        finally:
+            if was_closed:
+                image.close()
+            else:
+                image.seek(0)
+    except (OSError, ValueError, SuspiciousFileOperation):
+        return None
+    width, height = picture.size
+    preview = picture.convert('RGB')
+    preview.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = BytesIO()
+    preview.filter(ImageFilter.GaussianBlur(PLACEHOLDER_BLUR)).save(
+        buffer, 'JPEG', quality=50
+    )
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_hash': digest.hexdigest(),
+        'image_placeholder': 'data:image/jpeg;base64,' + base64.b64encode(
+            buffer.getvalue()
+        ).decode(),
+    }
+
+
+def describe_post_image(post):
+    """Заполняет поля описания картинки поста. False - файла нет."""
+    description = describe_image(post.image) if post.image else None
+    for field in DESCRIPTION_FIELDS:
+        setattr(post, field, post._meta.get_field(field).get_default())
+    if description is None:
+        return False
+    for field, value in description.items():
+        setattr(post, field, value)
+    return True
+
+
+def save_picture(picture, file_, format_):
+    """Сохраняет картинку без EXIF и прочих метаданных."""
+    options = {'optimize': True}
+    if picture.info.get('icc_profile'):
+        options['icc_profile'] = picture.info['icc_profile']
+    if format_ in ('JPEG', 'WEBP'):
+        options['quality'] = IMAGE_QUALITY
+    if format_ == 'JPEG' and picture.mode not in ('RGB', 'L', 'CMYK'):
+        picture = flatten(picture)
+    for key in METADATA_KEYS:
+        picture.info.pop(key, None)
+    picture.save(file_, format_, **options)
+
+
+def flatten(picture):
+    """Картинка без прозрачности - на белом фоне."""
+    picture = picture.convert('RGBA')
+    background = Image.new('RGB', picture.size, 'white')
+    background.paste(picture, mask=picture.getchannel('A'))
+    return background
+
+
+def prepare_upload(upload):
+    """Проверяет загруженную картинку и готовит её к сохранению.
+
+    Картинка поворачивается по EXIF, уменьшается до IMAGE_MAX_SIDE
+    и пересохраняется в тот же файл загрузки в прежнем формате, без
+    метаданных.
+    Анимации сохраняются как есть: пересохранение оставило бы один кадр.
+    """
+    if upload.size > IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s.', code='file_too_large',
+            params={'limit': filesizeformat(IMAGE_MAX_BYTES)},
+        )
+    upload.seek(0)
+    picture = Image.open(upload)
+    width, height = picture.size
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.',
+            code='image_too_large',
+            params={'limit': IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    format_ = 'JPEG' if picture.format == 'MPO' else picture.format
+    if getattr(picture, 'is_animated', False) or format_ not in Image.SAVE:
+        upload.seek(0)
+        return upload
+    picture = ImageOps.exif_transpose(picture)
+    picture.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+    upload.seek(0)
+    upload.truncate()
+    save_picture(picture, upload, format_)
+    upload.size = upload.tell()
+    upload.seek(0)
+    return upload
+
+
+def variant_widths(width):
+    """Ширины уменьшенных копий картинки: без увеличения, хотя бы одна."""
+    widths = {size for size in IMAGE_VARIANT_WIDTHS if size < width}
+    widths.add(min(width, IMAGE_VARIANT_WIDTHS[-1]))
+    return sorted(widths)
+
+
+def variant_name(name, width, extension):
+    return f'{os.path.splitext(name)[0]}_{width}w.{extension}'
+
+
+def parse_variants(variants):
+    """Ширины из поля Post.image_variants."""
+    return [int(width) for width in variants.split()]
+
+
+def write_variants(name, storage=default_storage):
+    """Пишет уменьшенные копии картинки рядом с ней.
+
+    Возвращает ширины копий или None, если картинка не открывается.
+    Копии картинки, названной по содержимому, пишутся один раз на все
+    посты с ней.
+    """
+    try:
+        with storage.open(name, 'rb') as source:
+            picture = Image.open(source)
+            widths = variant_widths(picture.width)
+            variants = {
+                (width, format_): variant_name(name, width, extension)
+                for width in widths
+                for extension, format_ in IMAGE_VARIANT_FORMATS
+            }
+            if is_content_name(name) and all(
+                map(storage.exists, variants.values())
+            ):
+                return widths
+            picture.load()
+    except (OSError, ValueError, SuspiciousFileOperation):
+        return None
+    has_alpha = picture.mode in ('RGBA', 'LA', 'PA') or (
+        'transparency' in picture.info
+    )
+    picture = picture.convert('RGBA' if has_alpha else 'RGB')
+    for width in widths:
+        height = max(1, round(picture.height * width / picture.width))
+        resized = picture.resize((width, height), Image.LANCZOS)
+        for _, format_ in IMAGE_VARIANT_FORMATS:
+            buffer = BytesIO()
+            save_picture(resized, buffer, format_)
+            variant = variants[width, format_]
+            storage.delete(variant)
+            storage.save(variant, ContentFile(buffer.getvalue()))
+    return widths
+
+
+def delete_variants(name, storage=default_storage):
+    """Удаляет уменьшенные копии картинки, лежащие рядом с ней."""
+    directory, base = os.path.split(os.path.splitext(name)[0])
+    pattern = re.compile(rf'{re.escape(base)}_\d+w\.\w+$')
+    try:
+        _, files = storage.listdir(directory)
+    except (OSError, SuspiciousFileOperation):
+        return
+    for file_name in files:
+        if pattern.match(file_name):
+            storage.delete(os.path.join(directory, file_name))
+
+
+def move_variants(name, new_name, widths, storage=default_storage):
+    """Переносит копии картинки к её новому имени; уже готовые
+    копии нового имени не перезаписываются.
+    """
+    for width in widths:
+        for extension, _ in IMAGE_VARIANT_FORMATS:
+            variant = variant_name(name, width, extension)
+            if not storage.exists(variant):
+                continue
+            new_variant = variant_name(new_name, width, extension)
+            if storage.exists(new_variant):
+                storage.delete(variant)
+            else:
+                os.replace(storage.path(variant), storage.path(new_variant))
+
+
+def release_image(name):
+    """Снимает ссылку поста на картинку. Когда ссылок не осталось,
+    вместе с файлом удаляются его копии и миниатюры.
+    """
+    storage = Post.image.field.storage
+    if storage.release(name):
+        delete_variants(name)
+        delete_thumbnails(ImageFile(name, storage), delete_file=False)
@@ -0,0 +1,84 @@
+import time
+from itertools import chain, islice
+
+from django.core.management.base import BaseCommand
+
+from posts.garbage import (
+    is_fresh, media_roots, read_cursor, remove, save_cursor, unreferenced,
+    walk
+)
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки, уменьшенные копии и миниатюры, на которые '
+            'не ссылается ни один пост. Обход продолжается с места, '
+            'где остановился прошлый запуск.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Сколько файлов проверять одним запросом.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=0,
+            help='Сколько файлов проверить за запуск; 0 - до конца.',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких файлов в секунду; 0 - без паузы.',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Файлы моложе стольких секунд не трогаются.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать обход с начала.',
+        )
+
+    def handle(self, *args, batch_size, limit, rate, min_age, dry_run,
+               restart, **options):
+        storage = Post.image.field.storage
+        after = '' if restart else read_cursor()
+        files = chain.from_iterable(
+            walk(storage, root, after) for root in media_roots()
+        )
+        checked = removed = 0
+        cursor = after
+        while not limit or checked < limit:
+            started = time.monotonic()
+            size = min(batch_size, limit - checked) if limit else batch_size
+            batch = list(islice(files, size))
+            if not batch:
+                cursor = ''
+                break
+            for name in unreferenced([
+                name for name in batch
+                if not is_fresh(storage, name, min_age)
+            ]):
+                if dry_run:
+                    self.stdout.write(name)
+                elif not remove(storage, name):
+                    continue
+                removed += 1
+            checked += len(batch)
+            cursor = batch[-1]
+            if not dry_run:
+                save_cursor(cursor)
+            if rate:
+                time.sleep(max(
+                    0, len(batch) / rate - (time.monotonic() - started)
+                ))
+        if not dry_run:
+            save_cursor(cursor)
+        action = 'к удалению' if dry_run else 'удалено'
+        self.stdout.write(
+            f'Проверено файлов: {checked}, {action}: {removed}. '
+            + (f'Следующий запуск продолжит после {cursor}.' if cursor
+               else 'Обход завершён.')
+        )
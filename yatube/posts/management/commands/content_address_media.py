@@ -0,0 +1,60 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Now
+from sorl.thumbnail import delete as delete_thumbnails
+
+from core.storage import is_content_name
+from posts.images import move_variants, parse_variants
+from posts.models import Post
+from posts.signals import touch_post_feeds
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки существующих постов в хранилище, '
+            'адресованное содержимым: одинаковые файлы сливаются в один.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько постов читать одним запросом.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        storage = Post.image.field.storage
+        posts = Post.objects.exclude(image='').only(
+            'image', 'image_variants', 'author_id', 'group_id'
+        ).order_by('id')
+        moved = missing = last_id = 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for post in batch:
+                name = post.image.name
+                if is_content_name(name):
+                    continue
+                try:
+                    with storage.open(name, 'rb') as source:
+                        new_name = storage.save(name, source)
+                except (OSError, SuspiciousFileOperation):
+                    missing += 1
+                    continue
+                Post.objects.filter(id=post.id).update(
+                    image=new_name, updated=Now()
+                )
+                # Закешированные фрагменты лент ссылаются на старый файл.
+                touch_post_feeds(post.author_id, post.group_id)
+                if Post.objects.filter(image=name).exists():
+                    Post.objects.filter(id=post.id).update(image_variants='')
+                else:
+                    move_variants(
+                        name, new_name, parse_variants(post.image_variants)
+                    )
+                    storage.delete(name)
+                    delete_thumbnails(name, delete_file=False)
+                moved += 1
+        self.stdout.write(
+            f'Перенесено картинок: {moved}, без файла: {missing}. '
+            'Миниатюры перенесённых картинок готовит make_thumbnails.'
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import DESCRIPTION_FIELDS, describe_post_image
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, хеш и размытую заглушку картинок '
+            'существующих постов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько постов обновлять одним запросом.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        posts = Post.objects.exclude(image='').filter(
+            image_hash=''
+        ).only('image', *DESCRIPTION_FIELDS).order_by('id')
+        described = missing = last_id = 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for post in batch:
+                if describe_post_image(post):
+                    described += 1
+                else:
+                    missing += 1
+            Post.objects.bulk_update(batch, DESCRIPTION_FIELDS)
+            last_id = batch[-1].id
+        self.stdout.write(
+            f'Описано картинок: {described}, без файла: {missing}.'
+        )
@@ -0,0 +1,86 @@
+import re
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from posts.models import Follow, Group, Post, User
+from posts.paginators import KeysetPaginator
+
+# Кеш отключается, иначе часть запросов страницы не выполнится.
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class Command(BaseCommand):
+    help = 'Печатает план каждого запроса страниц приложения posts.'
+
+    def handle(self, *args, **options):
+        with override_settings(CACHES=NO_CACHE):
+            for url, user in self.urls():
+                self.explain_url(url, user)
+
+    def urls(self):
+        """Адреса страниц с аргументами из текущей базы."""
+        anonymous = AnonymousUser()
+        post = Post.objects.order_by('-pub_date', '-id').first()
+        group = Group.objects.first()
+        follow = Follow.objects.select_related('user').first()
+        user = follow.user if follow else User.objects.first()
+        urls = [(reverse('posts:index'), anonymous)]
+        if post is not None:
+            cursor = KeysetPaginator(Post.objects.all(), 1).cursor_for(post)
+            urls += [
+                (reverse('posts:index') + f'?after={cursor}', anonymous),
+                (reverse('posts:index') + '?page=2', anonymous),
+                (reverse('posts:profile', args=[post.author.username]),
+                 anonymous),
+                (reverse('posts:post_detail', args=[post.id]), anonymous),
+                (reverse('posts:post_edit', args=[post.id]), post.author),
+            ]
+        if group is not None:
+            urls.append(
+                (reverse('posts:group_list', args=[group.slug]), anonymous)
+            )
+        if user is not None:
+            urls += [
+                (reverse('posts:follow_index'), user),
+                (reverse('posts:post_create'), user),
+            ]
+        return urls
+
+    def explain_url(self, url, user):
+        request = RequestFactory().get(url)
+        request.user = user
+        match = resolve(request.path_info)
+        with CaptureQueriesContext(connection) as queries:
+            match.func(request, *match.args, **match.kwargs)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{match.namespace}:{match.url_name} {url}'
+        ))
+        tables = set(connection.introspection.table_names())
+        seen = set()
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or sql in seen:
+                continue
+            seen.add(sql)
+            self.stdout.write(f'  {sql}')
+            for line in self.plan(sql):
+                scan = FULL_SCAN.match(line)
+                if scan and scan.group(1) in tables or TEMP_SORT in line:
+                    self.stdout.write(self.style.WARNING(f'    ! {line}'))
+                else:
+                    self.stdout.write(f'    {line}')
+
+    def plan(self, sql):
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}')
+            return [' '.join(map(str, row[3:] or row)) for row in cursor]
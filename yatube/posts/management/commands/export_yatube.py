@@ -0,0 +1,44 @@
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import MODELS, export_lines
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, пользователей, посты, комментарии '
+            'и подписки в JSON Lines.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки; - или ничего - стандартный вывод.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, path, chunk_size, **options):
+        started = time.monotonic()
+        if path == '-':
+            total = self.export(
+                partial(self.stdout.write, ending=''), chunk_size
+            )
+        else:
+            with open(path, 'w', encoding='utf-8') as out:
+                total = self.export(out.write, chunk_size)
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено строк: {total} за {elapsed:.1f} с, '
+            f'{total / max(elapsed, 1e-9):.0f} строк/с.'
+        )
+
+    def export(self, write, chunk_size):
+        total = 0
+        for model, _ in MODELS:
+            for line in export_lines(model, chunk_size):
+                write(line)
+                total += 1
+        return total
@@ -0,0 +1,48 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import Importer, rebuild_derived
+
+
+class Command(BaseCommand):
+    help = ('Загружает выгрузку export_yatube: пачками bulk_create, '
+            'с новыми id, затем пересчитывает счётчики и ленты подписок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки; - или ничего - стандартный ввод.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк записывать одной транзакцией.',
+        )
+
+    def handle(self, *args, path, batch_size, **options):
+        started = time.monotonic()
+        importer = Importer(batch_size)
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        try:
+            for number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    importer.add(json.loads(line))
+                except (ValueError, LookupError) as error:
+                    raise CommandError(f'Строка {number}: {error}')
+            importer.finish()
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        elapsed = time.monotonic() - started
+        rebuild_derived(self.stderr)
+        total = sum(importer.counts.values())
+        for model, count in importer.counts.items():
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {count}')
+        self.stdout.write(
+            f'Загружено строк: {total} за {elapsed:.1f} с, '
+            f'{total / max(elapsed, 1e-9):.0f} строк/с.'
+        )
@@ -0,0 +1,160 @@
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.db.models import Max, Min
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Group, Post, Profile, User
+
+URL_NAMES = ('index', 'group_list', 'profile', 'post_detail', 'follow_index')
+# Адрес не из INTERNAL_IPS: панель отладки не должна мерить сама себя.
+REMOTE_ADDR = '192.0.2.1'
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def sample(model, field, count, rng):
+    """Значения field у случайных строк model - по случайным id,
+    без ORDER BY RANDOM() по всей таблице.
+    """
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    ids = [
+        rng.randint(bounds['low'], bounds['high']) for _ in range(count)
+    ]
+    return list(model.objects.filter(pk__in=ids).values_list(
+        field, flat=True
+    ))
+
+
+class Command(BaseCommand):
+    help = ('Нагружает WSGI-приложение параллельными клиентами и выводит '
+            'задержки p50/p95/p99 и число запросов к базе по страницам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Сколько запросов к каждой странице.',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Сколько клиентов работают одновременно.',
+        )
+        parser.add_argument(
+            '--urls', nargs='+', choices=URL_NAMES, default=URL_NAMES,
+            help='Какие страницы нагружать.',
+        )
+        parser.add_argument(
+            '--user',
+            help='Кем входить на ленту подписок; по умолчанию - '
+                 'пользователь с наибольшим числом подписок.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, requests, threads, urls, user, seed, **options):
+        rng = random.Random(seed)
+        self.user = self.reader(user)
+        targets = [
+            (name, path)
+            for name in urls
+            for path in self.paths(name, requests, rng)
+        ]
+        if not targets:
+            raise CommandError('Нечего нагружать: база пуста.')
+        rng.shuffle(targets)
+        self.local = threading.local()
+        started = time.monotonic()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(self.fetch, targets))
+        elapsed = time.monotonic() - started
+        self.report(results, elapsed)
+
+    def reader(self, username):
+        if username:
+            return User.objects.get(username=username)
+        profile = Profile.objects.order_by('-following_count').first()
+        return profile.user if profile else None
+
+    def paths(self, name, count, rng):
+        """count адресов страницы name по случайным строкам базы."""
+        url = f'posts:{name}'
+        if name == 'index':
+            values = [()]
+        elif name == 'follow_index':
+            values = [()] if self.user else []
+        elif name == 'group_list':
+            values = [(slug,) for slug in sample(Group, 'slug', count, rng)]
+        elif name == 'profile':
+            values = [
+                (username,)
+                for username in sample(User, 'username', count, rng)
+            ]
+        else:
+            values = [(id,) for id in sample(Post, 'id', count, rng)]
+        if not values:
+            return []
+        return [reverse(url, args=rng.choice(values)) for _ in range(count)]
+
+    def client(self, name):
+        """Клиенты потока: анонимный и вошедший для ленты подписок."""
+        if not hasattr(self.local, 'clients'):
+            anonymous = Client(REMOTE_ADDR=REMOTE_ADDR)
+            reader = Client(REMOTE_ADDR=REMOTE_ADDR)
+            if self.user:
+                reader.force_login(self.user)
+            self.local.clients = anonymous, reader
+        return self.local.clients[name == 'follow_index']
+
+    def fetch(self, target):
+        name, path = target
+        client = self.client(name)
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            started = time.perf_counter()
+            response = client.get(path)
+            latency = time.perf_counter() - started
+        return name, latency, queries, response.status_code < 400
+
+    def report(self, results, elapsed):
+        by_name = defaultdict(list)
+        for name, latency, queries, ok in results:
+            by_name[name].append((latency, queries, ok))
+        self.stdout.write(
+            f'{"страница":<14}{"запросов":>9}{"ошибок":>8}'
+            f'{"p50, мс":>9}{"p95, мс":>9}{"p99, мс":>9}{"SQL/запрос":>12}'
+        )
+        for name in URL_NAMES:
+            rows = by_name.get(name)
+            if not rows:
+                continue
+            latencies = [latency * 1000 for latency, _, _ in rows]
+            self.stdout.write(
+                f'{name:<14}{len(rows):>9}'
+                f'{sum(not ok for _, _, ok in rows):>8}'
+                + ''.join(
+                    f'{percentile(latencies, share):>9.1f}'
+                    for share in (0.5, 0.95, 0.99)
+                )
+                + f'{sum(q for _, q, _ in rows) / len(rows):>12.1f}'
+            )
+        self.stdout.write(
+            f'Всего {len(results)} запросов за {elapsed:.1f} с, '
+            f'{len(results) / max(elapsed, 1e-9):.0f} в секунду.'
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core.processes import django_pool
+
+from posts.models import Post
+from posts.settings import THUMBNAIL_WORKERS
+from posts.thumbnails import make_post_thumbnail
+
+
+class Command(BaseCommand):
+    help = ('Готовит миниатюры картинок существующих постов '
+            'в пуле процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=THUMBNAIL_WORKERS,
+            help='Число процессов; 0 - в текущем процессе.',
+        )
+
+    def handle(self, *args, workers, **options):
+        post_ids = list(
+            Post.objects.exclude(image='').values_list('id', flat=True)
+        )
+        if workers:
+            with django_pool(workers) as pool:
+                made = sum(pool.map(
+                    make_post_thumbnail, post_ids, chunksize=16
+                ))
+        else:
+            made = sum(map(make_post_thumbnail, post_ids))
+        self.stdout.write(
+            f'Миниатюр готово: {made}, '
+            f'картинок без файла: {len(post_ids) - made}.'
+        )
@@ -0,0 +1,36 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow, Profile, TimelineEntry
+from posts.timeline import CELEBRITIES_KEY, backfill, prune_timelines
+
+
+class Command(BaseCommand):
+    help = 'Заново собирает ленты подписок из подписок и постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Только обрезать ленты до TIMELINE_LENGTH записей.',
+        )
+
+    def handle(self, *args, prune, **options):
+        if prune:
+            self.stdout.write(f'Записей удалено: {prune_timelines()}')
+            return
+        cache.delete(CELEBRITIES_KEY)
+        TimelineEntry.objects.all().delete()
+        # Посты всех авторов, кроме популярных, разложатся заново;
+        # популярных backfill пометит снова.
+        Profile.objects.filter(merge_on_read=True).update(
+            merge_on_read=False
+        )
+        follows = Follow.objects.order_by('user_id').values_list(
+            'user_id', 'author_id'
+        )
+        count = 0
+        for user_id, author_id in follows.iterator():
+            backfill(user_id, author_id, trim=False)
+            count += 1
+        prune_timelines()
+        self.stdout.write(f'Подписок обработано: {count}')
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import MediaFile
+from core.storage import is_content_name
+from posts.models import Comment, Follow, Post, Profile, User
+
+
+def count_of(model, field, key='pk'):
+    """Подзапрос: число строк model, у которых field равно полю key
+    строки.
+    """
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef(key)}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев, подписок '
+            'и ссылок на медиафайлы пачками, исправляя расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк обновлять одним запросом.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        missing = User.objects.filter(
+            profile__isnull=True
+        ).values_list('id', flat=True)
+        Profile.objects.bulk_create(
+            (Profile(user_id=user_id) for user_id in missing.iterator()),
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+        profiles = self.recount(Profile, batch_size, {
+            'posts_count': count_of(Post, 'author'),
+            'followers_count': count_of(Follow, 'author'),
+            'following_count': count_of(Follow, 'user'),
+        })
+        posts = self.recount(Post, batch_size, {
+            'comments_count': count_of(Comment, 'post'),
+        })
+        # Картинки, попавшие в базу мимо хранилища (импорт), получают
+        # MediaFile: иначе release() такой же загрузки удалит их файл.
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        MediaFile.objects.bulk_create(
+            (MediaFile(name=name) for name in names.iterator()
+             if is_content_name(name)),
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+        media = self.recount(MediaFile, batch_size, {
+            'references': count_of(Post, 'image', 'name'),
+        })
+        self.stdout.write(
+            f'Профилей: {profiles}, постов: {posts}, медиафайлов: {media}'
+        )
+
+    def recount(self, model, batch_size, counters):
+        """Обновляет счётчики диапазонами pk, по запросу на пачку."""
+        ids = model.objects.order_by('pk').values_list('pk', flat=True)
+        last = 0
+        total = 0
+        while True:
+            upper = ids.filter(pk__gt=last)[batch_size - 1:batch_size].first()
+            rows = model.objects.filter(pk__gt=last)
+            if upper is not None:
+                rows = rows.filter(pk__lte=upper)
+            total += rows.update(**counters)
+            if upper is None:
+                return total
+            last = upper
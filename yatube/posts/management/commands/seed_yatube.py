@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.seeding import Seeder
+from posts.transfer import rebuild_derived
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу правдоподобными пользователями, группами, '
+            'постами, комментариями и подписками для нагрузочных тестов.')
+
+    def add_arguments(self, parser):
+        for name, default in (
+            ('users', 1000), ('groups', 20), ('posts', 10000),
+            ('comments', 20000), ('follows', 5000),
+        ):
+            parser.add_argument(
+                f'--{name}', type=int, default=default,
+                help=f'Сколько создать; по умолчанию {default}.',
+            )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней разбросать даты.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: одинаковое зерно - одинаковые данные.',
+        )
+        parser.add_argument(
+            '--password', default='yatube',
+            help='Пароль всех созданных пользователей.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк записывать одним запросом.',
+        )
+
+    def handle(self, *args, users, groups, posts, comments, follows, days,
+               seed, password, batch_size, **options):
+        started = time.monotonic()
+        seeder = Seeder(seed, days, batch_size)
+        user_ids = seeder.users(max(users, 1), password)
+        group_ids = seeder.groups(groups)
+        post_ids = seeder.posts(posts, user_ids, group_ids)
+        if post_ids[1] >= post_ids[0]:
+            seeder.comments(comments, user_ids, post_ids)
+        seeder.follows(follows, user_ids)
+        rebuild_derived(self.stderr)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Создано за {elapsed:.1f} с: пользователей {users}, '
+            f'групп {groups}, постов {posts}, комментариев {comments}, '
+            f'подписок до {follows}.'
+        )
@@ -0,0 +1,77 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+import django.db.models.deletion
+
+
+def counts_by(model, field):
+    return dict(
+        model.objects.order_by().values(field).annotate(
+            count=Count('id')
+        ).values_list(field, 'count')
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Profile = apps.get_model('posts', 'Profile')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    posts = counts_by(Post, 'author')
+    followers = counts_by(Follow, 'author')
+    following = counts_by(Follow, 'user')
+    Profile.objects.bulk_create(
+        (
+            Profile(
+                user_id=user_id,
+                posts_count=posts.get(user_id, 0),
+                followers_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0),
+            )
+            for user_id in User.objects.values_list('id', flat=True)
+        ),
+        batch_size=1000,
+    )
+    # Один UPDATE с подзапросом, как count_of в recount, и только
+    # для постов с комментариями.
+    Post.objects.filter(
+        id__in=Comment.objects.values('post_id')
+    ).update(comments_count=Subquery(
+        Comment.objects.filter(post_id=OuterRef('pk')).order_by().values(
+            'post_id'
+        ).annotate(count=Count('id')).values('count'),
+        output_field=IntegerField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0017_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Профиль',
+                'verbose_name_plural': 'Профили',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
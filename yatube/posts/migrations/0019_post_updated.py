@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:02
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def fill_updated(apps, schema_editor):
+    apps.get_model('posts', 'Post').objects.update(updated=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Правка поста или его комментариев', verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_image_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.CharField(blank=True, editable=False, help_text='Через пробел; пусто, пока копии не готовы', max_length=64, verbose_name='Ширины уменьшенных копий'),
+        ),
+    ]
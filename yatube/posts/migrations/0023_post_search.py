@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# Полнотекстовый индекс текстов постов. Таблица FTS5 хранит только
+# индекс (content='posts_post'), триггеры держат его в согласии
+# с таблицей постов при любых записях, в том числе через update().
+CREATE_INDEX = (
+    """
+    CREATE VIRTUAL TABLE posts_post_search USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER posts_post_search_insert AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_post_search(rowid, text)
+        VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_search_delete AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO posts_post_search(posts_post_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_search_update AFTER UPDATE OF text
+    ON posts_post
+    BEGIN
+        INSERT INTO posts_post_search(posts_post_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_search(rowid, text)
+        VALUES (new.id, new.text);
+    END
+    """,
+    "INSERT INTO posts_post_search(posts_post_search) VALUES ('rebuild')",
+)
+DROP_INDEX = (
+    'DROP TRIGGER IF EXISTS posts_post_search_update',
+    'DROP TRIGGER IF EXISTS posts_post_search_delete',
+    'DROP TRIGGER IF EXISTS posts_post_search_insert',
+    'DROP TABLE IF EXISTS posts_post_search',
+)
+
+
+def execute(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(execute(CREATE_INDEX), execute(DROP_INDEX)),
+    ]
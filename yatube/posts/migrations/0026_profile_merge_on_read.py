@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_post_image_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='merge_on_read',
+            field=models.BooleanField(default=False, editable=False, help_text='Ставится, когда посты автора не разложены по лентам', verbose_name='Посты подмешиваются в ленты при чтении'),
+        ),
+    ]
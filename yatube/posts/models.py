@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 SUBSCRIPTION = '{user} подписался на {author}'
@@ -29,12 +31,28 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты ленты с автором и группой в одном запросе."""
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image', 'image_width', 'image_height',
+            'image_placeholder', 'image_variants',
+            'comments_count',
+            'author', 'author__username',
+            'group', 'group__slug', 'group__title',
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Текст нового поста'
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated = models.DateTimeField(
+        'Дата изменения', auto_now=True,
+        help_text='Правка поста или его комментариев',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -54,15 +72,67 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         help_text='Поле для загрузки картинки',
 
     )
 
+    # Описание картинки заполняется при сохранении поста, чтобы
+    # рендер страниц не открывал файлы.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False
+    )
+    image_hash = models.CharField(
+        'SHA-256 картинки', max_length=64, blank=True, editable=False
+    )
+    image_placeholder = models.TextField(
+        'Размытая заглушка картинки', blank=True, editable=False
+    )
+    image_variants = models.CharField(
+        'Ширины уменьшенных копий', max_length=64, blank=True,
+        editable=False,
+        help_text='Через пробел; пусто, пока копии не готовы',
+    )
+
+    comments_count = models.PositiveIntegerField(
+        'Комментариев', default=0, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
+
+    # Счётчики меняет только UPDATE с F() из counters.py: сохранение
+    # поста не должно затирать их значением, прочитанным раньше.
+    counter_fields = ('comments_count',)
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_pub_date_idx'),
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.text[:15]
@@ -93,6 +163,10 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -121,8 +195,74 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'author'], name="unique_followers")
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'),
+        ]
 
     def __str__(self):
         return SUBSCRIPTION.format(
             user=self.user.username, author=self.author.username
         )
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+        help_text='Владелец ленты подписок',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+        help_text='Пост в ленте подписок',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи лент подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_user_date_post_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class Profile(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='profile',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, db_index=True
+    )
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    merge_on_read = models.BooleanField(
+        'Посты подмешиваются в ленты при чтении', default=False,
+        editable=False,
+        help_text='Ставится, когда посты автора не разложены по лентам',
+    )
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return str(self.user_id)
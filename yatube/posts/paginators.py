@@ -0,0 +1,283 @@
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .counters import feed_count
+from .settings import COMMENTS_PER_PAGE, PAGES_BY_NUMBER
+
+CURSOR_SEPARATOR = '|'
+
+
+def encode_cursor(value, pk):
+    """Упаковывает ключ записи (дата, id) в непрозрачный токен."""
+    return urlsafe_base64_encode(
+        f'{value.isoformat()}{CURSOR_SEPARATOR}{pk}'.encode()
+    )
+
+
+def decode_cursor(token):
+    """Распаковывает токен в (дата, id) или возвращает None."""
+    try:
+        value, pk = urlsafe_base64_decode(token).decode().split(
+            CURSOR_SEPARATOR
+        )
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class KeysetPage(Page):
+    """Страница, открытая по курсору: без номера и без COUNT(*)."""
+
+    def __init__(self, object_list, paginator, cursor,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Page after {self.cursor}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор ленты по ключу (дата, id).
+
+    Первые PAGES_BY_NUMBER страниц доступны по номеру, как у обычного
+    Paginator. Последняя из них получает курсор next_cursor, дальше
+    страницы выбираются условием по ключу без OFFSET. Если передана
+    лента feed, число записей берётся из кеша счётчиков.
+    """
+    ordering = ('-pub_date', '-id')
+    pages_by_number = PAGES_BY_NUMBER
+
+    def __init__(self, object_list, per_page, feed=None):
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+        self.feed = feed
+
+    @cached_property
+    def count(self):
+        if self.feed is None:
+            return super().count
+        return feed_count(self.feed, self.object_list)
+
+    @property
+    def key_field(self):
+        return self.ordering[0].lstrip('-')
+
+    @property
+    def descending(self):
+        return self.ordering[0].startswith('-')
+
+    @cached_property
+    def num_pages(self):
+        """Число страниц, доступных по номеру."""
+        pages = -(-max(1, self.count) // self.per_page)
+        return min(pages, self.pages_by_number)
+
+    @property
+    def has_more(self):
+        """Есть ли записи глубже последней страницы с номером."""
+        return self.count > self.num_pages * self.per_page
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        page = self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+        if number == self.num_pages and self.has_more and len(page):
+            page.next_cursor = self.cursor_for(page[-1])
+        return page
+
+    def cursor_for(self, obj):
+        return encode_cursor(getattr(obj, self.key_field), obj.pk)
+
+    def parse_cursor(self, token):
+        return decode_cursor(token)
+
+    def _beyond(self, cursor, lookup):
+        value, pk = cursor
+        # Нестрогое условие по дате отдельно - чтобы шёл поиск
+        # по диапазону индекса, а не OR по всей таблице.
+        return self.object_list.filter(
+            **{f'{self.key_field}__{lookup}e': value}
+        ).filter(
+            Q(**{f'{self.key_field}__{lookup}': value})
+            | Q(**{f'pk__{lookup}': pk})
+        )
+
+    def get_cursor_page(self, after=None, before=None):
+        """Страница сразу за курсором after или перед курсором before.
+
+        Битый курсор и начало ленты отдают первую страницу по номеру.
+        """
+        cursor = self.parse_cursor(after or before)
+        if cursor is None:
+            return self.get_page(1)
+        older, newer = ('lt', 'gt') if self.descending else ('gt', 'lt')
+        if after:
+            objects = list(self._beyond(cursor, older)[:self.per_page + 1])
+            next_cursor = None
+            if len(objects) > self.per_page:
+                objects = objects[:self.per_page]
+                next_cursor = self.cursor_for(objects[-1])
+            return KeysetPage(
+                objects, self, after, next_cursor,
+                self.cursor_for(objects[0]) if objects else None,
+            )
+        objects = list(
+            self._beyond(cursor, newer).reverse()[:self.per_page + 1]
+        )
+        if len(objects) <= self.per_page:
+            return self.get_page(1)
+        objects = objects[:self.per_page][::-1]
+        return KeysetPage(
+            objects, self, before,
+            self.cursor_for(objects[-1]), self.cursor_for(objects[0]),
+        )
+
+    def get_page_for(self, query):
+        """Страница по параметрам запроса: курсор или номер."""
+        after, before = query.get('after'), query.get('before')
+        if after or before:
+            return self.get_cursor_page(after=after, before=before)
+        return self.get_page(query.get('page'))
+
+
+class TimelinePaginator(KeysetPaginator):
+    """Лента подписок, слитая из нескольких источников.
+
+    Источник - условие на посты, поле даты и поле id, по которым идёт
+    его индекс. Из каждого берётся не больше страницы постов за курсором
+    вместе с автором и группой, посты сливаются по ключу (дата, id).
+    Дальше первой страницы - только по курсору, записи не считаются.
+    """
+    pages_by_number = 1
+
+    def __init__(self, sources, posts, per_page):
+        super().__init__(posts, per_page)
+        self.sources = sources
+
+    def posts(self, limit, cursor=None, newer=False):
+        """До limit постов за курсором в порядке ленты; с newer -
+        ближайшие более новые, от старых к новым.
+        """
+        lookup = 'gt' if newer else 'lt'
+        posts = {}
+        for condition, date_field, id_field in self.sources:
+            queryset = self.object_list.filter(**condition)
+            if cursor is not None:
+                value, pk = cursor
+                queryset = queryset.filter(
+                    **{f'{date_field}__{lookup}e': value}
+                ).filter(
+                    Q(**{f'{date_field}__{lookup}': value})
+                    | Q(**{f'{id_field}__{lookup}': pk})
+                )
+            ordering = (date_field, id_field)
+            if not newer:
+                ordering = tuple(f'-{field}' for field in ordering)
+            posts.update(
+                (post.pk, post)
+                for post in queryset.order_by(*ordering)[:limit]
+            )
+        return sorted(
+            posts.values(), key=lambda post: (post.pub_date, post.pk),
+            reverse=not newer,
+        )[:limit]
+
+    @cached_property
+    def first_posts(self):
+        return self.posts(self.per_page + 1)
+
+    @cached_property
+    def count(self):
+        return len(self.first_posts)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        page = self._get_page(
+            self.first_posts[:self.per_page], number, self
+        )
+        if self.has_more:
+            page.next_cursor = self.cursor_for(page[-1])
+        return page
+
+    def get_cursor_page(self, after=None, before=None):
+        cursor = self.parse_cursor(after or before)
+        if cursor is None:
+            return self.get_page(1)
+        if after:
+            posts = self.posts(self.per_page + 1, cursor)
+            next_cursor = None
+            if len(posts) > self.per_page:
+                posts = posts[:self.per_page]
+                next_cursor = self.cursor_for(posts[-1])
+            return KeysetPage(
+                posts, self, after, next_cursor,
+                self.cursor_for(posts[0]) if posts else None,
+            )
+        posts = self.posts(self.per_page + 1, cursor, newer=True)
+        if len(posts) <= self.per_page:
+            return self.get_page(1)
+        posts = posts[:self.per_page][::-1]
+        return KeysetPage(
+            posts, self, before,
+            self.cursor_for(posts[-1]), self.cursor_for(posts[0]),
+        )
+
+
+class CommentPaginator(KeysetPaginator):
+    """Комментарии поста: от старых к новым, дальше первой страницы -
+    только по курсору. Число комментариев берётся из счётчика поста.
+    """
+    ordering = ('created', 'id')
+    pages_by_number = 1
+
+    def __init__(self, post, per_page=COMMENTS_PER_PAGE):
+        super().__init__(post.comments.select_related('author'), per_page)
+        self.post = post
+
+    @cached_property
+    def count(self):
+        return self.post.comments_count
+
+
+class SearchPaginator(KeysetPaginator):
+    """Результаты поиска по релевантности (rank, id). Дальше первой
+    страницы - только по курсору, число результатов не считается:
+    достаточно знать, есть ли что-то за первой страницей.
+    """
+    ordering = ('rank', 'id')
+    pages_by_number = 1
+
+    @cached_property
+    def count(self):
+        return len(self.object_list.values('pk')[:self.per_page + 1])
+
+    def cursor_for(self, obj):
+        return urlsafe_base64_encode(
+            f'{obj.rank!r}{CURSOR_SEPARATOR}{obj.pk}'.encode()
+        )
+
+    def parse_cursor(self, token):
+        try:
+            rank, pk = urlsafe_base64_decode(token).decode().split(
+                CURSOR_SEPARATOR
+            )
+            return float(rank), int(pk)
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,65 @@
+"""Полнотекстовый поиск постов по индексу FTS5 posts_post_search.
+
+Индекс ведут триггеры из миграции 0023_post_search. Каждое слово
+запроса ищется как префикс, слова объединяются через AND.
+"""
+import re
+
+from django.db.models import CharField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .settings import SEARCH_SNIPPET_TOKENS
+
+SEARCH_TABLE = 'posts_post_search'
+# Границы совпадений в сниппете. Текст поста экранируется
+# в шаблоне, поэтому разметка ставится только после экранирования.
+MARK_START = '\x02'
+MARK_END = '\x03'
+WORD = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """Запрос FTS5 из пользовательской строки или '' - искать нечего.
+
+    Слова берутся в кавычки: синтаксис FTS5 (OR, NEAR, *, -)
+    из запроса не исполняется.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query.lower()))
+
+
+def matching_ids(match):
+    """Подзапрос id постов, подходящих под выражение match."""
+    return RawSQL(
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+        [match],
+    )
+
+
+def search_posts(query):
+    """Посты, подходящие под запрос, с релевантностью rank (меньше -
+    лучше, bm25) и сниппетом snippet с отмеченными совпадениями.
+    """
+    match = match_expression(query)
+    if not match:
+        return Post.objects.annotate(
+            rank=Value(0, FloatField()), snippet=Value('', CharField())
+        ).none()
+    return Post.objects.select_related('author', 'group').extra(
+        tables=[SEARCH_TABLE],
+        where=[
+            f'{SEARCH_TABLE}.rowid = posts_post.id',
+            f'{SEARCH_TABLE} MATCH %s',
+        ],
+        params=[match],
+    ).annotate(
+        rank=RawSQL(f'bm25({SEARCH_TABLE})', []),
+        snippet=RawSQL(
+            f'snippet({SEARCH_TABLE}, 0, %s, %s, %s, %s)',
+            [MARK_START, MARK_END, '…', SEARCH_SNIPPET_TOKENS],
+        ),
+    ).only(
+        'pub_date', 'comments_count',
+        'author', 'author__username',
+        'group', 'group__slug', 'group__title',
+    )
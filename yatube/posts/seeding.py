@@ -0,0 +1,121 @@
+"""Правдоподобные данные для нагрузочных тестов.
+
+Популярность распределена по степенному закону: немногие авторы пишут
+большую часть постов и собирают большую часть подписчиков, немногие
+посты собирают большую часть комментариев.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from faker import Faker
+
+from .models import Comment, Follow, Group, Post, User
+from .transfer import preserved_dates
+
+
+def skewed_index(size, rng):
+    """Номер от 0 до size - 1, P(номер < k) ~ log k / log size:
+    маленькие номера выпадают гораздо чаще больших.
+    """
+    return min(int((size + 1) ** rng.random()) - 1, size - 1)
+
+
+class Seeder:
+    def __init__(self, seed=0, days=365, batch_size=1000):
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.now = timezone.now()
+        self.days = days
+        self.batch_size = batch_size
+
+    def moment(self):
+        return self.now - timedelta(
+            seconds=self.rng.randrange(self.days * 24 * 60 * 60)
+        )
+
+    def last_id(self, model):
+        return model.objects.aggregate(top=Max('pk'))['top'] or 0
+
+    def bulk(self, model, count, make):
+        """Создаёт count строк пачками, возвращает (первый id, последний).
+        Id берутся из базы: автоинкремент SQLite не повторяет удалённые.
+        """
+        before = self.last_id(model)
+        for start in range(0, count, self.batch_size):
+            objects = [
+                make(index)
+                for index in range(start, min(count, start + self.batch_size))
+            ]
+            with transaction.atomic(), preserved_dates():
+                model.objects.bulk_create(
+                    objects, ignore_conflicts=model is Follow
+                )
+        created = model.objects.filter(pk__gt=before).aggregate(
+            first=Min('pk'), last=Max('pk')
+        )
+        return created['first'] or before + 1, created['last'] or before
+
+    def users(self, count, password):
+        password = make_password(password)
+        base = self.last_id(User)
+        return self.bulk(User, count, lambda index: User(
+            username=f'{self.fake.user_name()}{base + index + 1}'[:150],
+            first_name=self.fake.first_name(),
+            last_name=self.fake.last_name(),
+            email=self.fake.email(),
+            password=password,
+            date_joined=self.moment(),
+        ))
+
+    def groups(self, count):
+        base = self.last_id(Group)
+        return self.bulk(Group, count, lambda index: Group(
+            title=self.fake.word().capitalize(),
+            slug=f'group-{base + index + 1}',
+            description=self.fake.sentence(),
+        ))
+
+    def posts(self, count, users, groups):
+        def make(index):
+            pub_date = self.moment()
+            has_group = groups[1] >= groups[0] and self.rng.random() < 0.7
+            return Post(
+                text=self.fake.paragraph(nb_sentences=5),
+                author_id=self.pick(users),
+                group_id=self.rng.randint(*groups) if has_group else None,
+                pub_date=pub_date,
+                updated=pub_date,
+            )
+        return self.bulk(Post, count, make)
+
+    def comments(self, count, users, posts):
+        return self.bulk(Comment, count, lambda index: Comment(
+            post_id=self.pick(posts, newest_first=True),
+            author_id=self.rng.randint(*users),
+            text=self.fake.sentence(),
+            created=self.moment(),
+        ))
+
+    def follows(self, count, users):
+        """Подписки на популярных авторов; повторы и подписки на себя
+        пропускаются, поэтому их может выйти меньше count.
+        """
+        def make(index):
+            user_id, author_id = self.rng.randint(*users), self.pick(users)
+            if user_id == author_id:
+                author_id = users[0] if author_id == users[1] else users[1]
+            return Follow(user_id=user_id, author_id=author_id)
+        if users[1] <= users[0]:
+            return None
+        return self.bulk(Follow, count, make)
+
+    def pick(self, id_range, newest_first=False):
+        """Id из диапазона со степенным перекосом популярности."""
+        first, last = id_range
+        index = skewed_index(last - first + 1, self.rng)
+        return last - index if newest_first else first + index
@@ -1 +1,57 @@
 POSTS_PER_PAGE = 10
+# Столько первых страниц ленты открываются по номеру (?page=N),
+# глубже лента листается курсорами (?after=/?before=) без OFFSET.
+PAGES_BY_NUMBER = 50
+# Комментарии на странице поста подгружаются порциями по курсору.
+COMMENTS_PER_PAGE = 20
+# Счётчики постов в лентах живут в кеше и правятся при записи постов.
+# Таймаут страхует от расхождений, если запись прошла мимо сигналов.
+FEED_COUNT_TIMEOUT = 60 * 60 * 24
+# Ленты длиннее этого порога считаются приблизительно: COUNT идёт
+# по подзапросу с LIMIT и даёт нижнюю границу, которая живёт недолго.
+APPROXIMATE_COUNT_FROM = 10000
+APPROXIMATE_COUNT_TIMEOUT = 60 * 10
+# Фрагменты лент кешируются под ключом из идентичности ленты и её
+# поколения. Записи постов, комментариев и подписок сдвигают поколение
+# затронутых лент, поэтому фрагменты могут жить часами.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+FEED_GENERATION_TIMEOUT = 60 * 60 * 24 * 2
+# Столько секунд обратный прокси может отдавать анонимам страницу
+# без перепроверки; браузеры перепроверяют её по ETag каждый раз.
+PUBLIC_CACHE_MAX_AGE = 30
+# Лента подписок материализуется при записи: новый пост раскладывается
+# в TimelineEntry подписчиков. rebuild_timelines --prune по расписанию
+# оставляет каждому не больше TIMELINE_LENGTH последних записей.
+TIMELINE_LENGTH = 1000
+# Посты авторов, у которых подписчиков больше, не раскладываются,
+# а подмешиваются в ленту при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_CELEBRITIES_TIMEOUT = 60 * 10
+# Миниатюры картинок постов готовятся пулом процессов после сохранения
+# поста, а не при первом рендере страницы.
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'padding': True}
+THUMBNAIL_WORKERS = 2
+# Размытая заглушка картинки хранится в посте data URI: не больше
+# PLACEHOLDER_SIZE точек по большей стороне.
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_BLUR = 1
+# Загрузка картинки: файлы больше IMAGE_MAX_BYTES байт и картинки больше
+# IMAGE_MAX_PIXELS точек форма не принимает. Принятая картинка
+# поворачивается по EXIF, теряет метаданные и уменьшается до
+# IMAGE_MAX_SIDE точек по большей стороне.
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_MAX_SIDE = 2560
+IMAGE_QUALITY = 82
+# Уменьшенные копии картинки для srcset: ширины и форматы
+# (расширение, формат PIL). Первый формат - основной для <picture>,
+# последний - запасной для <img>.
+IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+IMAGE_VARIANT_FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+# Курсор обхода collect_media_garbage - файл в MEDIA_ROOT, вне каталогов
+# обхода: переживает очистку кеша и перезапуск.
+MEDIA_GARBAGE_CURSOR = 'state/media_garbage_cursor'
+# Поиск: в сниппете результата столько слов вокруг совпадений.
+SEARCH_SNIPPET_TOKENS = 24
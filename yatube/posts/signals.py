@@ -0,0 +1,137 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .counters import (
+    author_feed, change_comments_count, change_feed_counts,
+    change_profile_counts, follow_feed, group_feed, post_feeds
+)
+from .generations import bump_generations
+from .images import describe_post_image, release_image
+from .models import Comment, Follow, Post, Profile, User
+from .timeline import backfill, drop, fan_out
+
+
+def touch_post_feeds(author_id, *group_ids):
+    """Сдвигает поколения лент, где виден пост. Ленты подписчиков
+    учитывают поколение ленты автора в ключе и отдельно не сдвигаются.
+    """
+    bump_generations(post_feeds(author_id, None) + [
+        group_feed(id) for id in set(group_ids) - {None}
+    ])
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_post(sender, instance, **kwargs):
+    """Запоминает группу и картинку поста до правки, чтобы перенести
+    счётчики и отпустить заменённую картинку.
+    """
+    if instance.pk is not None:
+        instance.saved_group_id, instance.saved_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image').first() or (None, '')
+
+
+@receiver(pre_save, sender=Post)
+def describe_saved_image(sender, instance, raw, **kwargs):
+    """Описывает новую картинку до сохранения поста; уменьшенные копии
+    прежней картинки ей не подходят.
+    """
+    image = instance.image
+    if raw or (image and image._committed and instance.image_hash):
+        return
+    if image or instance.image_hash:
+        describe_post_image(instance)
+        instance.image_variants = ''
+
+
+def release_after_commit(name):
+    """Отпускает картинку, когда запись поста точно состоялась."""
+    if name:
+        transaction.on_commit(lambda: release_image(name))
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw, **kwargs):
+    saved_image = getattr(instance, 'saved_image', '')
+    if not raw and saved_image != instance.image.name:
+        release_after_commit(saved_image)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    saved_group_id = getattr(instance, 'saved_group_id', None)
+    touch_post_feeds(instance.author_id, instance.group_id, saved_group_id)
+    if created:
+        change_profile_counts(instance.author_id, posts_count=1)
+        change_feed_counts(
+            post_feeds(instance.author_id, instance.group_id), 1
+        )
+        fan_out(instance)
+        return
+    if saved_group_id != instance.group_id:
+        if saved_group_id is not None:
+            change_feed_counts([group_feed(saved_group_id)], -1)
+        if instance.group_id is not None:
+            change_feed_counts([group_feed(instance.group_id)], 1)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    release_after_commit(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_profile_counts(instance.author_id, posts_count=-1)
+    change_feed_counts(post_feeds(instance.author_id, instance.group_id), -1)
+    touch_post_feeds(instance.author_id, instance.group_id)
+
+
+@receiver(post_save, sender=Follow)
+def save_follow(sender, instance, created, **kwargs):
+    bump_generations([follow_feed(instance.user_id)])
+    if created:
+        change_profile_counts(instance.author_id, followers_count=1)
+        change_profile_counts(instance.user_id, following_count=1)
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def delete_follow(sender, instance, **kwargs):
+    bump_generations([follow_feed(instance.user_id)])
+    change_profile_counts(instance.author_id, followers_count=-1)
+    change_profile_counts(instance.user_id, following_count=-1)
+    drop(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created and instance.post_id is not None:
+        change_comments_count(instance.post_id, 1)
+        touch_commented_post(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        change_comments_count(instance.post_id, -1)
+        touch_commented_post(instance)
+
+
+def touch_commented_post(comment):
+    """Счётчики комментариев видны в лентах поста и в профиле
+    комментатора - сдвигает их поколения.
+    """
+    bump_generations([author_feed(comment.author_id)])
+    post = Post.objects.filter(id=comment.post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        touch_post_feeds(*post)
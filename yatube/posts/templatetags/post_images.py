@@ -0,0 +1,79 @@
+from collections.abc import Mapping
+
+from django import template
+
+from ..images import parse_variants, variant_name
+from ..settings import IMAGE_SIZES, IMAGE_VARIANT_FORMATS, THUMBNAIL_GEOMETRY
+from ..thumbnails import ready_thumbnail, ready_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_thumbnails(posts):
+    """Миниатюры всех картинок страницы ленты одним обращением к kvstore.
+
+    Ставится внутри блока cache: при попадании в кеш не выполняется.
+    Посты с готовыми уменьшенными копиями миниатюры не ищут.
+    """
+    return ready_thumbnails([
+        post.image for post in posts if not post.image_variants
+    ])
+
+
+def srcset(image, widths, extension):
+    return ', '.join(
+        f'{image.storage.url(variant_name(image.name, width, extension))}'
+        f' {width}w'
+        for width in widths
+    )
+
+
+@register.inclusion_tag('posts/includes/image.html')
+def post_image(post, thumbnails=None):
+    """Уменьшенные копии картинки поста с srcset, без них - миниатюра,
+    а пока нет и её - заглушка того же размера.
+
+    Копии и миниатюру готовит пул процессов после сохранения поста,
+    рендер страницы картинки не открывает: ширины копий и размеры
+    картинки хранятся в посте, размеры миниатюры - в kvstore, размытая
+    заглушка - в посте. Если передан результат page_thumbnails,
+    миниатюра берётся из него без обращения к kvstore.
+    """
+    width, height = THUMBNAIL_GEOMETRY.split('x')
+    image = post.image
+    widths = parse_variants(post.image_variants) if image else []
+    if widths:
+        extension = IMAGE_VARIANT_FORMATS[-1][0]
+        fallback = max(
+            [size for size in widths if size <= int(width)] or widths[:1]
+        )
+        return {
+            'image': image,
+            'sources': [
+                {'type': f'image/{format_.lower()}',
+                 'srcset': srcset(image, widths, extension)}
+                for extension, format_ in IMAGE_VARIANT_FORMATS[:-1]
+            ],
+            'src': image.storage.url(
+                variant_name(image.name, fallback, extension)
+            ),
+            'srcset': srcset(image, widths, extension),
+            'sizes': IMAGE_SIZES,
+            'placeholder': post.image_placeholder,
+            'width': post.image_width,
+            'height': post.image_height,
+        }
+    if not image:
+        thumbnail = None
+    elif isinstance(thumbnails, Mapping):
+        thumbnail = thumbnails.get(image.name)
+    else:
+        thumbnail = ready_thumbnail(image)
+    return {
+        'image': image,
+        'im': thumbnail,
+        'placeholder': post.image_placeholder,
+        'width': width,
+        'height': height,
+    }
@@ -0,0 +1,129 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..admin import PostAdmin
+from ..counters import feed_count, group_feed
+from ..models import Comment, Follow, Group, Post, User
+
+POSTS_URL = reverse('admin:posts_post_changelist')
+CHANGELISTS = (
+    reverse('admin:posts_post_changelist'),
+    reverse('admin:posts_comment_changelist'),
+    reverse('admin:posts_follow_changelist'),
+)
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.old_group = Group.objects.create(
+            title='Старая', slug='old', description='Старая группа'
+        )
+        cls.new_group = Group.objects.create(
+            title='Новая', slug='new', description='Новая группа'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            author = User.objects.create_user(
+                username=f'user{User.objects.count()}'
+            )
+            post = Post.objects.create(
+                author=author, text='Пост', group=self.old_group
+            )
+            Comment.objects.create(post=post, author=author, text='Ура')
+            Follow.objects.create(user=author, author=self.admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Список в админке - постоянное число запросов на страницу"""
+        self.add_rows(2)
+        small = [self.changelist_queries(url) for url in CHANGELISTS]
+        self.add_rows(10)
+        for url, queries in zip(CHANGELISTS, small):
+            with self.subTest(url=url):
+                self.assertEqual(self.changelist_queries(url), queries)
+
+    def test_changelist_count_estimate(self):
+        """Большой список оценивается по ключам, отфильтрованный
+        считается точно; страницы не обрезаются"""
+        self.add_rows(5)
+        Post.objects.filter(
+            id=Post.objects.order_by('id')[2].id
+        ).delete()
+        with mock.patch('posts.admin.APPROXIMATE_COUNT_FROM', 1), \
+                mock.patch.object(PostAdmin, 'list_per_page', 2):
+            unfiltered = self.client.get(POSTS_URL).context['cl'].paginator
+            filtered = self.client.get(
+                POSTS_URL, {'group__id__exact': self.old_group.id}
+            ).context['cl'].paginator
+        self.assertEqual(unfiltered.count, 5)
+        self.assertEqual(unfiltered.num_pages, 3)
+        self.assertEqual(filtered.count, 4)
+
+    def test_post_form_does_not_list_users(self):
+        """Форма поста не выводит всех пользователей в <select>"""
+        self.add_rows(3)
+        post = Post.objects.first()
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=[post.id])
+        )
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, '>user2</option>')
+
+    def test_change_form_saves_all_fields(self):
+        """Правка в админке обновляет и поля, которых нет в форме"""
+        self.add_rows(1)
+        post = Post.objects.first()
+        Post.objects.filter(id=post.id).update(
+            updated='2020-01-01T00:00:00Z'
+        )
+        self.client.post(
+            reverse('admin:posts_post_change', args=[post.id]), {
+                'text': 'Правка', 'author': post.author_id,
+                'group': self.old_group.id,
+            }
+        )
+        post = Post.objects.get(id=post.id)
+        self.assertEqual(post.text, 'Правка')
+        self.assertGreater(post.updated.year, 2020)
+
+    def test_move_to_group_is_one_update(self):
+        """Перенос в группу - один UPDATE и верные счётчики лент"""
+        self.add_rows(3)
+        ids = list(Post.objects.values_list('id', flat=True))
+        for group in (self.old_group, self.new_group):
+            feed_count(group_feed(group.id), group.posts.all())
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(POSTS_URL, {
+                'action': 'move_to_group',
+                '_selected_action': ids,
+                'group': self.new_group.id,
+            })
+        updates = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "posts_post"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.new_group.posts.count(), 3)
+        for group, count in ((self.old_group, 0), (self.new_group, 3)):
+            with self.subTest(group=group.slug):
+                self.assertEqual(
+                    feed_count(group_feed(group.id), group.posts.all()),
+                    count
+                )
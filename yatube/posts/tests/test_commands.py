@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Follow, Group, Post, User
+
+SLUG = 'test-slug-1'
+AUTHOR = 'author'
+FOLLOWER = 'follower'
+
+
+class CommandsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=SLUG,
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def test_explain_queries(self):
+        """explain_queries печатает планы запросов всех страниц ленты."""
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        output = out.getvalue()
+        for text in ['posts:index', 'posts:group_list', 'posts:profile',
+                     'posts:follow_index', 'posts:post_detail',
+                     'post_pub_date_idx', 'post_group_pub_date_idx']:
+            with self.subTest(text=text):
+                self.assertIn(text, output)
@@ -0,0 +1,167 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..counters import (
+    INDEX_FEED, author_feed, feed_count, feed_count_key, group_feed
+)
+from ..models import Comment, Follow, Group, Post, Profile, User
+from ..settings import POSTS_PER_PAGE
+
+SLUG = 'test-slug-1'
+SLUG2 = 'test-slug-2'
+AUTHOR = 'author'
+FOLLOWER = 'follower'
+MAIN_URL = reverse('posts:index')
+
+
+class FeedCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+        cls.group = Group.objects.create(
+            title='Тестовая группа 1',
+            slug=SLUG,
+            description='Тестовое описание 1',
+        )
+        cls.group2 = Group.objects.create(
+            title='Тестовая группа 2',
+            slug=SLUG2,
+            description='Тестовое описание 2',
+        )
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.feeds = {
+            INDEX_FEED: Post.objects.all(),
+            author_feed(self.author.id): self.author.posts.all(),
+            group_feed(self.group.id): self.group.posts.all(),
+            group_feed(self.group2.id): self.group2.posts.all(),
+        }
+        for feed, posts in self.feeds.items():
+            feed_count(feed, posts)
+
+    def assertCountsMatch(self):
+        """Счётчик в кеше либо верен, либо сброшен."""
+        for feed, posts in self.feeds.items():
+            with self.subTest(feed=feed):
+                self.assertIn(
+                    cache.get(feed_count_key(feed)), [None, posts.count()]
+                )
+        self.assertEqual(
+            cache.get(feed_count_key(INDEX_FEED)), Post.objects.count()
+        )
+
+    def test_count_is_cached(self):
+        """Повторный подсчёт ленты не ходит в базу."""
+        with self.assertNumQueries(0):
+            self.assertEqual(feed_count(INDEX_FEED, Post.objects.all()), 1)
+
+    def test_counts_follow_post_writes(self):
+        """Создание, перенос и удаление поста правят счётчики лент."""
+        post = Post.objects.create(
+            author=self.author, text='Новый пост', group=self.group
+        )
+        self.assertCountsMatch()
+        post.group = self.group2
+        post.save()
+        self.assertCountsMatch()
+        post.delete()
+        self.assertCountsMatch()
+
+    def test_large_feed_counted_approximately(self):
+        """Большая лента считается только до порога."""
+        cache.clear()
+        with mock.patch('posts.counters.APPROXIMATE_COUNT_FROM', 1):
+            Post.objects.create(author=self.author, text='Второй пост')
+            self.assertEqual(feed_count(INDEX_FEED, Post.objects.all()), 1)
+
+    def test_paginator_renders_page_window(self):
+        """Пагинатор выводит окно номеров, а не все страницы."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}')
+            for i in range(POSTS_PER_PAGE * 10)
+        )
+        cache.clear()
+        response = Client().get(MAIN_URL + '?page=6')
+        for page, shown in [[2, False], [3, True], [9, True], [10, False]]:
+            with self.subTest(page=page):
+                self.assertEqual(
+                    f'href="?page={page}"' in response.content.decode(),
+                    shown
+                )
+
+
+class ProfileCountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+
+    def assertProfile(self, user, posts, followers, following):
+        profile = Profile.objects.get(user=user)
+        self.assertEqual(
+            [profile.posts_count, profile.followers_count,
+             profile.following_count],
+            [posts, followers, following]
+        )
+
+    def test_counters_follow_writes(self):
+        """Счётчики профиля и поста меняются вместе с записями."""
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.follower, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertProfile(self.author, 1, 1, 0)
+        self.assertProfile(self.follower, 0, 0, 1)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assertProfile(self.author, 0, 0, 0)
+        self.assertProfile(self.follower, 0, 0, 0)
+
+    def test_post_save_keeps_comments_count(self):
+        """Сохранение поста не затирает счётчик, сдвинутый после чтения."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        stale = Post.objects.get(id=post.id)
+        Comment.objects.create(
+            post=post, author=self.follower, text='Комментарий'
+        )
+        stale.text = 'Правка'
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Правка')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_recount_repairs_drift(self):
+        """recount исправляет разошедшиеся счётчики."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Comment.objects.create(
+            post=post, author=self.follower, text='Комментарий'
+        )
+        Profile.objects.update(
+            posts_count=7, followers_count=7, following_count=7
+        )
+        Profile.objects.filter(user=self.follower).delete()
+        Post.objects.update(comments_count=7)
+        call_command('recount', batch_size=1, stdout=StringIO())
+        self.assertProfile(self.author, 1, 1, 0)
+        self.assertProfile(self.follower, 0, 0, 1)
+        self.assertEqual(Post.objects.get().comments_count, 1)
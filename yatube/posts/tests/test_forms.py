@@ -8,6 +8,8 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from core.storage import content_name
+
 from ..models import Post, Group, User, Comment
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -108,7 +110,9 @@ class PostFormTests(TestCase):
         post = posts.pop()
         self.assertEqual(form_data['text'], post.text)
         self.assertEqual(form_data['group'], post.group.id)
-        self.assertEqual(f"{UPLOAD_TO}{form_data['image']}", post.image)
+        self.assertEqual(content_name(
+            f"{UPLOAD_TO}{form_data['image']}", post.image_hash
+        ), post.image)
         self.assertEqual(self.user, post.author)
 
     def test_edit_post(self):
@@ -134,7 +138,9 @@ class PostFormTests(TestCase):
         self.assertEqual(Post.objects.count(), posts_count)
         self.assertEqual(form_data['text'], post.text)
         self.assertEqual(form_data['group'], post.group.id)
-        self.assertEqual(f"{UPLOAD_TO}{form_data['image']}", post.image)
+        self.assertEqual(content_name(
+            f"{UPLOAD_TO}{form_data['image']}", post.image_hash
+        ), post.image)
         self.assertEqual(self.user, self.post.author)
 
     def test_post_create_and_edit_page_correct_context(self):
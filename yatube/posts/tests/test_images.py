@@ -0,0 +1,203 @@
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
+from ..models import Post, User
+from ..thumbnails import make_post_thumbnail
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+USER = 'author'
+MAIN_URL = reverse('posts:index')
+POST_CREATE_URL = reverse('posts:post_create')
+ORIENTATION = 0x0112
+ROTATED_270 = 6
+MISSING_IMAGE = 'posts/missing.gif'
+DATA_URI = 'data:image/jpeg;base64,'
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def jpeg(size=(1200, 600), **options):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', **options)
+    return SimpleUploadedFile(
+        'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageDescriptionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, image):
+        return Post.objects.create(
+            author=self.user, text='Пост с картинкой', image=image
+        )
+
+    def test_upload_is_described(self):
+        """Сохранение поста записывает размеры, хеш и заглушку"""
+        post = self.create_post(SimpleUploadedFile(
+            'small.gif', SMALL_GIF, content_type='image/gif'
+        ))
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(SMALL_GIF).hexdigest()
+        )
+        self.assertTrue(post.image_placeholder.startswith(DATA_URI))
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), SMALL_GIF)
+
+    def test_missing_file_and_removed_image(self):
+        """Пост без файла картинки сохраняется без описания"""
+        post = self.create_post(MISSING_IMAGE)
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_hash, '')
+        post = self.create_post(SimpleUploadedFile(
+            'small.gif', SMALL_GIF, content_type='image/gif'
+        ))
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.image_width, post.image_hash, post.image_placeholder),
+            (None, '', '')
+        )
+
+    def test_feed_renders_placeholder_without_files(self):
+        """Лента рендерит заглушку из поста, не открывая файлов"""
+        self.create_post(SimpleUploadedFile(
+            'small.gif', SMALL_GIF, content_type='image/gif'
+        ))
+        with mock.patch(
+            'django.core.files.storage.FileSystemStorage._open'
+        ) as open_file:
+            response = Client().get(MAIN_URL)
+        open_file.assert_not_called()
+        self.assertContains(response, DATA_URI)
+
+    def test_backfill_command(self):
+        """Команда описывает картинки существующих постов"""
+        described = self.create_post(SimpleUploadedFile(
+            'small.gif', SMALL_GIF, content_type='image/gif'
+        ))
+        self.create_post(MISSING_IMAGE)
+        Post.objects.update(
+            image_width=None, image_height=None,
+            image_hash='', image_placeholder='',
+        )
+        out = StringIO()
+        call_command('describe_images', batch_size=1, stdout=out)
+        self.assertIn('Описано картинок: 1, без файла: 1', out.getvalue())
+        described.refresh_from_db()
+        self.assertEqual(described.image_width, 2)
+        self.assertTrue(described.image_placeholder.startswith(DATA_URI))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def form(self, image):
+        return PostForm({'text': 'Пост'}, files={'image': image})
+
+    def test_limits(self):
+        """Форма не принимает слишком тяжёлые и слишком большие картинки"""
+        cases = (
+            ('IMAGE_MAX_BYTES', 100, 'file_too_large'),
+            ('IMAGE_MAX_PIXELS', 1000, 'image_too_large'),
+        )
+        for setting, limit, code in cases:
+            with self.subTest(setting=setting), mock.patch(
+                f'posts.images.{setting}', limit
+            ):
+                form = self.form(jpeg())
+                self.assertFalse(form.is_valid())
+                self.assertTrue(form.has_error('image', code))
+
+    def test_orientation_fixed_and_metadata_stripped(self):
+        """Картинка поворачивается по EXIF и сохраняется без метаданных"""
+        exif = Image.Exif()
+        exif[ORIENTATION] = ROTATED_270
+        self.author_client.post(POST_CREATE_URL, {
+            'text': 'Фото с телефона',
+            'image': jpeg(exif=exif.tobytes()),
+        })
+        post = Post.objects.get(text='Фото с телефона')
+        self.assertEqual((post.image_width, post.image_height), (600, 1200))
+        with post.image.open('rb') as image:
+            picture = Image.open(image)
+            self.assertEqual(picture.size, (600, 1200))
+            self.assertEqual(dict(picture.getexif()), {})
+
+    def test_variants_in_srcset(self):
+        """Лента отдаёт уменьшенные копии в srcset, не открывая файлов"""
+        post = Post.objects.create(
+            author=self.user, text='Пост с картинкой', image=jpeg()
+        )
+        self.assertContains(Client().get(MAIN_URL), 'bg-light')
+        self.assertTrue(make_post_thumbnail(post.id))
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants, '480 960 1200')
+        root = post.image.url.rsplit('.', 1)[0]
+        with mock.patch(
+            'django.core.files.storage.FileSystemStorage._open'
+        ) as open_file, self.assertNumQueries(1):
+            # Только страница: число постов уже в кеше, kvstore не нужен.
+            response = Client().get(MAIN_URL)
+        open_file.assert_not_called()
+        self.assertContains(
+            response,
+            f'srcset="{root}_480w.webp 480w, {root}_960w.webp 960w, '
+            f'{root}_1200w.webp 1200w"'
+        )
+        self.assertContains(response, f'src="{root}_960w.jpg"')
+        self.assertContains(response, 'width="1200" height="600"')
+        for width in (480, 960, 1200):
+            with self.subTest(width=width):
+                name = post.image.name.rsplit('.', 1)[0] + f'_{width}w.webp'
+                with post.image.storage.open(name) as variant:
+                    self.assertEqual(Image.open(variant).width, width)
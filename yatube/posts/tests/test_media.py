@@ -0,0 +1,236 @@
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from core.models import MediaFile
+from core.storage import is_content_name
+
+from ..garbage import remove, unreferenced
+from ..images import variant_name
+from ..models import Post, User
+from ..thumbnails import make_post_thumbnail, ready_thumbnail
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+USER = 'author'
+ORPHANS = [
+    'cache/00/00/orphan.jpg',
+    'posts/orphan.png',
+    'posts/orphan_480w.webp',
+]
+HOUR = 60 * 60
+
+
+def png_bytes(color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', (600, 300), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def png(name='picture.png', color='red'):
+    return SimpleUploadedFile(name, png_bytes(color), 'image/png')
+
+
+def run_on_commit(callback):
+    callback()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@mock.patch('posts.signals.transaction.on_commit', run_on_commit)
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, image):
+        return Post.objects.create(author=self.user, text='Пост', image=image)
+
+    def test_reposted_image_shares_file_and_variants(self):
+        """Повторная загрузка не пишет ни файла, ни уменьшенных копий"""
+        first = self.create_post(png('first.png'))
+        make_post_thumbnail(first.id)
+        second = self.create_post(png('second.png'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_content_name(second.image.name))
+        with mock.patch('posts.images.save_picture') as save_picture:
+            self.assertTrue(make_post_thumbnail(second.id))
+        save_picture.assert_not_called()
+        second.refresh_from_db()
+        self.assertEqual(second.image_variants, '480 600')
+
+    def test_file_released_with_last_post(self):
+        """Файл, копии и миниатюры удаляются вместе с последним постом"""
+        posts = [self.create_post(png()) for _ in range(2)]
+        make_post_thumbnail(posts[0].id)
+        name = posts[0].image.name
+        variant = variant_name(name, 480, 'webp')
+        posts[0].delete()
+        self.assertTrue(default_storage.exists(name))
+        posts[1].delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(variant))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_replaced_image_released(self):
+        """Заменённая картинка поста отпускается"""
+        post = self.create_post(png())
+        name = post.image.name
+        post.image = png(color='blue')
+        post.save()
+        self.assertNotEqual(post.image.name, name)
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    def test_migration_command(self):
+        """Команда переносит старые файлы, сливая одинаковые"""
+        posts = [self.create_post(None) for _ in range(2)]
+        for i, post in enumerate(posts):
+            legacy = default_storage.save(
+                f'posts/legacy{i}.png', ContentFile(png_bytes())
+            )
+            Post.objects.filter(id=post.id).update(image=legacy)
+        self.create_post('posts/missing.png')
+        out = StringIO()
+        call_command('content_address_media', batch_size=1, stdout=out)
+        self.assertIn('Перенесено картинок: 2, без файла: 1', out.getvalue())
+        names = set(Post.objects.filter(
+            id__in=[post.id for post in posts]
+        ).values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_content_name(name))
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
+        self.assertFalse(default_storage.exists('posts/legacy0.png'))
+        self.assertFalse(default_storage.exists('posts/legacy1.png'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaGarbageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.post = Post.objects.create(
+            author=self.user, text='Пост', image=png()
+        )
+        make_post_thumbnail(self.post.id)
+        for name in ORPHANS:
+            default_storage.save(name, ContentFile(png_bytes()))
+        self.age_files()
+
+    def age_files(self):
+        old = time.time() - 2 * HOUR
+        for directory, _, files in os.walk(TEMP_MEDIA_ROOT):
+            for file_name in files:
+                os.utime(os.path.join(directory, file_name), (old, old))
+
+    def collect(self, **options):
+        out = StringIO()
+        call_command('collect_media_garbage', stdout=out, **options)
+        return out.getvalue()
+
+    def live_files(self):
+        names = [self.post.image.name, ready_thumbnail(self.post.image).name]
+        names += [
+            variant_name(self.post.image.name, width, extension)
+            for width in (480, 600) for extension in ('jpg', 'webp')
+        ]
+        return names
+
+    def test_dry_run(self):
+        """Пробный запуск перечисляет сирот и ничего не удаляет"""
+        out = self.collect(dry_run=True)
+        for name in ORPHANS:
+            with self.subTest(name=name):
+                self.assertIn(name, out)
+                self.assertTrue(default_storage.exists(name))
+        self.assertIn('к удалению: 3', out)
+
+    def test_orphans_removed(self):
+        """Удаляются только файлы, на которые не ссылается ни один пост"""
+        fresh = default_storage.save('posts/fresh.png', ContentFile(b'new'))
+        self.assertIn('удалено: 3', self.collect())
+        for name in ORPHANS:
+            with self.subTest(name=name):
+                self.assertFalse(default_storage.exists(name))
+        for name in self.live_files() + [fresh]:
+            with self.subTest(name=name):
+                self.assertTrue(default_storage.exists(name))
+
+    def test_referenced_media_kept(self):
+        """Картинка со ссылкой в MediaFile и её копии не удаляются"""
+        MediaFile.objects.create(name=ORPHANS[1], references=1)
+        self.assertEqual(unreferenced(ORPHANS), ORPHANS[:1])
+        self.assertIn('удалено: 1', self.collect())
+        for name in ORPHANS[1:]:
+            with self.subTest(name=name):
+                self.assertTrue(default_storage.exists(name))
+
+    def test_remove_rechecks_references(self):
+        """Ссылка, взятая после проверки пачки, спасает файл"""
+        self.assertEqual(unreferenced(ORPHANS[1:]), ORPHANS[1:])
+        MediaFile.objects.create(name=ORPHANS[1], references=1)
+        for name in ORPHANS[1:]:
+            with self.subTest(name=name):
+                self.assertFalse(remove(default_storage, name))
+                self.assertTrue(default_storage.exists(name))
+        MediaFile.objects.filter(name=ORPHANS[1]).update(references=0)
+        self.assertTrue(remove(default_storage, ORPHANS[1]))
+        self.assertFalse(default_storage.exists(ORPHANS[1]))
+        self.assertFalse(MediaFile.objects.filter(name=ORPHANS[1]).exists())
+
+    def test_resumes_from_cursor(self):
+        """Запуск с лимитом продолжается следующим запуском"""
+        first = self.collect(limit=1, batch_size=1)
+        self.assertIn(f'продолжит после {ORPHANS[0]}', first)
+        self.assertFalse(default_storage.exists(ORPHANS[0]))
+        self.assertTrue(default_storage.exists(ORPHANS[1]))
+        # Курсор лежит в файле и переживает очистку кеша.
+        cache.clear()
+        second = self.collect()
+        self.assertIn('удалено: 2', second)
+        self.assertIn('Обход завершён', second)
+        self.assertIn('удалено: 0', self.collect(restart=True))
+
+    def test_references_checked_by_index(self):
+        """Ссылки на картинки и их копии ищутся по индексу Post.image"""
+        with CaptureQueriesContext(connection) as queries:
+            unreferenced(ORPHANS[1:])
+        sql = queries.captured_queries[0]['sql']
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(str(row[-1]) for row in cursor)
+        self.assertIn('post_image_idx', plan)
+        self.assertNotIn('SCAN', plan)
@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, User
+from ..paginators import KeysetPaginator, decode_cursor, encode_cursor
+from ..settings import POSTS_PER_PAGE
+
+USER = 'logged_user'
+MAIN_URL = reverse('posts:index')
+POSTS_COUNT = POSTS_PER_PAGE * 2 + 3
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый пост {i}')
+            for i in range(POSTS_COUNT)
+        )
+        # Одинаковые даты: порядок держится только на id.
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        cls.expected = list(Post.objects.order_by('-pub_date', '-id'))
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_round_trip(self):
+        """Курсор распаковывается в исходный ключ, битый - в None."""
+        post = self.expected[0]
+        self.assertEqual(
+            decode_cursor(encode_cursor(post.pub_date, post.pk)),
+            (post.pub_date, post.pk)
+        )
+        for token in ['', 'мусор', encode_cursor(post.pub_date, 'x')]:
+            with self.subTest(token=token):
+                self.assertIsNone(decode_cursor(token))
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """Курсоры after проходят ленту без пропусков и повторов."""
+        with mock.patch.object(KeysetPaginator, 'pages_by_number', 1):
+            paginator = KeysetPaginator(Post.objects.all(), POSTS_PER_PAGE)
+            page = paginator.get_page(1)
+            posts = list(page)
+            while page.next_cursor:
+                page = paginator.get_cursor_page(after=page.next_cursor)
+                posts += list(page)
+        self.assertEqual(posts, self.expected)
+
+    def test_before_cursor_returns_previous_page(self):
+        """Курсор before возвращает предыдущую страницу."""
+        paginator = KeysetPaginator(Post.objects.all(), POSTS_PER_PAGE)
+        second = paginator.get_cursor_page(
+            after=paginator.cursor_for(self.expected[POSTS_PER_PAGE - 1])
+        )
+        third = paginator.get_cursor_page(after=second.next_cursor)
+        self.assertEqual(
+            list(paginator.get_cursor_page(before=third.previous_cursor)),
+            list(second)
+        )
+        first = paginator.get_cursor_page(before=second.previous_cursor)
+        self.assertEqual(first.number, 1)
+        self.assertEqual(list(first), self.expected[:POSTS_PER_PAGE])
+
+    def test_page_numbers_limited(self):
+        """Номера страниц глубже лимита открывают последнюю из них."""
+        with mock.patch.object(KeysetPaginator, 'pages_by_number', 2):
+            page_obj = self.guest_client.get(
+                MAIN_URL + '?page=3').context['page_obj']
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(
+            list(page_obj),
+            self.expected[POSTS_PER_PAGE:POSTS_PER_PAGE * 2]
+        )
+        self.assertTrue(page_obj.next_cursor)
+
+    def test_feed_opens_by_cursor(self):
+        """Лента открывается по курсору из адреса."""
+        post = self.expected[POSTS_PER_PAGE * 2 - 1]
+        response = self.guest_client.get(
+            MAIN_URL, {'after': encode_cursor(post.pub_date, post.pk)}
+        )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            self.expected[POSTS_PER_PAGE * 2:]
+        )
+        self.assertContains(response, '?before=')
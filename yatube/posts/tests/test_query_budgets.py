@@ -0,0 +1,183 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from PIL import Image
+
+from ..models import Comment, Follow, Group, Post, User
+from ..settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+from ..thumbnails import make_post_thumbnail
+from ..transfer import rebuild_derived
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+PASSWORD = 'Budget-password-1'
+AUTHORS = 3
+COMMENTERS = 10
+
+
+def picture(number):
+    """Картинка со своим цветом: у каждой своё имя и своя миниатюра."""
+    buffer = BytesIO()
+    Image.new('RGB', (600, 300), (number, 0, 0)).save(buffer, 'PNG')
+    return SimpleUploadedFile(
+        f'budget{number}.png', buffer.getvalue(), 'image/png'
+    )
+
+
+def route_names(namespace):
+    """Имена всех маршрутов пространства имён namespace."""
+    resolver = get_resolver().namespace_dict[namespace][1]
+    return {
+        f'{namespace}:{pattern.name}'
+        for pattern in resolver.url_patterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    }
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTests(TestCase):
+    """Запросов к базе на каждый маршрут не больше бюджета,
+    сколько бы постов ни было на странице и комментариев у поста
+    и готовы ли миниатюры их картинок.
+    """
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}')
+            for i in range(AUTHORS)
+        ]
+        cls.author = cls.authors[0]
+        cls.reader = User.objects.create_user(
+            username='reader', password=PASSWORD
+        )
+        commenters = [
+            User.objects.create_user(username=f'commenter{i}')
+            for i in range(COMMENTERS)
+        ]
+        cls.group = Group.objects.create(
+            title='Группа', slug='budget', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(
+                author=cls.authors[i % AUTHORS],
+                group=cls.group,
+                text=f'Бюджетный пост {i}',
+            )
+            for i in range(POSTS_PER_PAGE * AUTHORS * 2)
+        )
+        cls.post = Post.objects.filter(author=cls.author).latest('id')
+        # Картинки у каждого второго поста первых страниц лент;
+        # миниатюры готовы у половины из них, у остальных - заглушка.
+        newest = Post.objects.order_by('-id')[:POSTS_PER_PAGE * AUTHORS]
+        for number, post in enumerate(newest):
+            if number % 2:
+                continue
+            post.image = picture(number)
+            post.save()
+            if number % 4:
+                make_post_thumbnail(post.id)
+        Comment.objects.bulk_create(
+            Comment(
+                post=cls.post,
+                author=commenters[i % COMMENTERS],
+                text=f'Комментарий {i}',
+            )
+            for i in range(COMMENTS_PER_PAGE * 2)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=cls.reader, author=author)
+            for author in cls.authors[1:]
+        )
+        rebuild_derived(StringIO())
+        cls.cursor = Client().get(
+            reverse('posts:post_detail', args=[cls.post.id])
+        ).context['comments'].next_cursor
+
+    def budgets(self):
+        """Маршрут, пользователь, метод, аргументы, данные и бюджет."""
+        post = [self.post.id]
+        author = [self.authors[1].username]
+        return [
+            ('posts:index', None, 'get', [], {}, 3),
+            ('posts:index', self.reader, 'get', [], {}, 5),
+            ('posts:group_list', None, 'get', ['budget'], {}, 5),
+            ('posts:profile', None, 'get', author, {}, 6),
+            ('posts:profile', self.reader, 'get', author, {}, 9),
+            ('posts:post_detail', None, 'get', post, {}, 3),
+            ('posts:post_detail', self.author, 'get', post, {}, 5),
+            ('posts:post_comments', None, 'get', post,
+             {'after': self.cursor}, 2),
+            ('posts:follow_index', self.reader, 'get', [], {}, 5),
+            ('posts:search', None, 'get', [], {'q': 'бюджет'}, 2),
+            ('posts:post_create', self.author, 'get', [], {}, 5),
+            ('posts:post_create', self.author, 'post', [],
+             {'text': 'Новый пост', 'group': self.group.id}, 11),
+            ('posts:post_edit', self.author, 'get', post, {}, 5),
+            ('posts:post_edit', self.author, 'post', post,
+             {'text': 'Правка', 'group': self.group.id}, 9),
+            ('posts:add_comment', self.reader, 'post', post,
+             {'text': 'Ещё комментарий'}, 9),
+            ('posts:profile_follow', self.reader, 'get',
+             [self.author.username], {}, 15),
+            ('posts:profile_unfollow', self.reader, 'get',
+             author, {}, 9),
+            ('users:signup', None, 'get', [], {}, 0),
+            ('users:signup', None, 'post', [], {
+                'first_name': 'Новый', 'last_name': 'Читатель',
+                'username': 'newcomer', 'email': 'new@example.com',
+                'password1': PASSWORD, 'password2': PASSWORD,
+            }, 6),
+            ('users:login', None, 'get', [], {}, 0),
+            ('users:login', None, 'post', [],
+             {'username': 'reader', 'password': PASSWORD}, 9),
+            ('users:logout', self.reader, 'get', [], {}, 4),
+            ('users:password_reset_form', None, 'get', [], {}, 0),
+            ('users:password_change_form', self.reader, 'get',
+             [], {}, 2),
+            ('users:password_change_done', self.reader, 'get',
+             [], {}, 2),
+            ('about:author', None, 'get', [], {}, 0),
+            ('about:tech', None, 'get', [], {}, 0),
+        ]
+
+    def test_every_route_has_budget(self):
+        """Бюджет задан для каждого маршрута posts, users и about"""
+        self.assertEqual(
+            {name for name, *_ in self.budgets()},
+            route_names('posts') | route_names('users')
+            | route_names('about'),
+        )
+
+    def test_query_budgets(self):
+        """Число запросов к базе укладывается в бюджет маршрута"""
+        for name, user, method, args, data, budget in self.budgets():
+            url = reverse(name, args=args)
+            with self.subTest(name=name, method=method):
+                cache.clear()
+                client = Client()
+                if user:
+                    client.force_login(user)
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(client, method)(url, data)
+                self.assertLess(response.status_code, 400)
+                self.assertLessEqual(
+                    len(queries), budget,
+                    f'{method.upper()} {url}: {len(queries)} запросов '
+                    f'при бюджете {budget}:\n' + '\n'.join(
+                        f'{number}. {query["sql"]}'
+                        for number, query in enumerate(queries, 1)
+                    ),
+                )
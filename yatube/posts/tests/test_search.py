@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post, User
+from ..search import search_posts
+from ..settings import POSTS_PER_PAGE
+
+USER = 'author'
+SEARCH_URL = reverse('posts:search')
+ADMIN_URL = reverse('admin:posts_post_changelist')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=USER)
+        cls.cat = Post.objects.create(
+            author=cls.user, text='Кошка спит на окне'
+        )
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Кошки, кошки и ещё раз кошки'
+        )
+        cls.dog = Post.objects.create(
+            author=cls.user, text='Собака <b>лает</b>'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query, **params):
+        return Client().get(SEARCH_URL, {'q': query, **params})
+
+    def test_ranked_prefix_search(self):
+        """Слова ищутся по префиксу, релевантные посты идут первыми"""
+        self.assertEqual(
+            list(search_posts('кош').order_by('rank', 'id')),
+            [self.cats, self.cat]
+        )
+        self.assertEqual(list(search_posts('кошка окне')), [self.cat])
+        self.assertEqual(list(search_posts('')), [])
+
+    def test_index_follows_writes(self):
+        """Индекс следует за правкой и удалением постов"""
+        Post.objects.filter(id=self.dog.id).update(text='Пёс молчит')
+        self.assertEqual(list(search_posts('собака')), [])
+        self.assertEqual(list(search_posts('молчит')), [self.dog])
+        Post.objects.filter(id=self.cat.id).delete()
+        self.assertEqual(list(search_posts('окне')), [])
+
+    def test_snippet_highlighted_and_escaped(self):
+        """Совпадения отмечены, текст поста экранирован"""
+        response = self.search('лает')
+        self.assertContains(response, '&lt;b&gt;<mark>лает</mark>&lt;/b&gt;')
+        self.assertNotContains(response, '<b>лает</b>')
+
+    def test_query_syntax_is_not_executed(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        for query in ('кошка OR', '"', 'NEAR(', '*', 'кош* -окне'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query).status_code, 200)
+
+    def test_keyset_paging(self):
+        """Вторая страница открывается по курсору без повторов"""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Кошка номер {i}')
+            for i in range(POSTS_PER_PAGE)
+        )
+        first = self.search('кошка')
+        page = first.context['page_obj']
+        self.assertEqual(len(page), POSTS_PER_PAGE)
+        self.assertTrue(page.next_cursor)
+        second = self.search('кошка', after=page.next_cursor)
+        rest = list(second.context['page_obj'])
+        self.assertEqual(len(rest), 1)
+        self.assertNotIn(rest[0], list(page))
+        self.assertFalse(second.context['page_obj'].has_next())
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по индексу FTS5"""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(ADMIN_URL, {'q': 'окне'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.cat]
+        )
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
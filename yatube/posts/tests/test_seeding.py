@@ -0,0 +1,109 @@
+import random
+from collections import Counter
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+
+from ..models import Comment, Follow, Group, Post, Profile, User
+from ..seeding import skewed_index
+
+
+class SeedTests(TestCase):
+    def seed(self, **options):
+        counts = dict(users=30, groups=3, posts=200, comments=300,
+                      follows=100, batch_size=50)
+        counts.update(options)
+        call_command('seed_yatube', stdout=StringIO(), stderr=StringIO(),
+                     **counts)
+
+    def test_skewed_index(self):
+        """Номера в пределах размера, маленькие выпадают чаще"""
+        rng = random.Random(1)
+        indexes = Counter(skewed_index(100, rng) for _ in range(5000))
+        self.assertTrue(set(indexes) <= set(range(100)))
+        self.assertGreater(
+            sum(indexes[i] for i in range(10)),
+            sum(indexes[i] for i in range(10, 100)) / 2,
+        )
+
+    def test_rows_and_counters(self):
+        """Строки созданы, профили и счётчики пересчитаны"""
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Profile.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertLessEqual(Follow.objects.count(), 100)
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')
+        ).exists())
+        profile = Profile.objects.order_by('-posts_count').first()
+        self.assertEqual(
+            profile.posts_count,
+            Post.objects.filter(author=profile.user).count(),
+        )
+        self.assertTrue(User.objects.first().check_password('yatube'))
+
+    def test_skewed_authors(self):
+        """Самый активный автор пишет заметно больше среднего"""
+        self.seed()
+        top = Profile.objects.order_by('-posts_count').first()
+        self.assertGreater(top.posts_count, 200 / 30 * 3)
+
+    def test_repeatable(self):
+        """Одинаковое зерно - одинаковые тексты, повторный запуск
+        дописывает строки, не конфликтуя с уже созданными
+        """
+        self.seed(seed=7)
+        texts = list(Post.objects.order_by('id').values_list(
+            'text', flat=True
+        ))
+        self.seed(seed=7)
+        self.assertEqual(User.objects.count(), 60)
+        self.assertEqual(Group.objects.count(), 6)
+        self.assertEqual(
+            list(Post.objects.order_by('id').values_list(
+                'text', flat=True
+            ))[200:],
+            texts,
+        )
+
+
+class LoadTestTests(TransactionTestCase):
+    """Потоки нагрузки ходят в базу своими соединениями,
+    поэтому данные должны быть записаны, а не висеть в транзакции теста.
+    """
+    def setUp(self):
+        cache.clear()
+        call_command('seed_yatube', users=10, groups=2, posts=40,
+                     comments=40, follows=20, stdout=StringIO(),
+                     stderr=StringIO())
+
+    def test_report(self):
+        """Отчёт по каждой странице: без ошибок, с перцентилями"""
+        out = StringIO()
+        call_command('load_test', requests=4, threads=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('p95', lines[0])
+        rows = {line.split()[0]: line.split() for line in lines[1:-1]}
+        self.assertEqual(set(rows), {
+            'index', 'group_list', 'profile', 'post_detail', 'follow_index',
+        })
+        for name, row in rows.items():
+            with self.subTest(name=name):
+                self.assertEqual(row[1:3], ['4', '0'])
+                self.assertGreater(float(row[-1]), 0)
+
+    def test_selected_urls(self):
+        """--urls ограничивает набор страниц"""
+        out = StringIO()
+        call_command('load_test', requests=2, threads=1, urls=['index'],
+                     stdout=out)
+        self.assertEqual(
+            [line.split()[0] for line in out.getvalue().splitlines()[1:-1]],
+            ['index'],
+        )
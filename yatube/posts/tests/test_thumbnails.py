@@ -0,0 +1,124 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post, User
+from ..thumbnails import (make_post_thumbnail, ready_thumbnail,
+                          ready_thumbnails)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+USER = 'author'
+MAIN_URL = reverse('posts:index')
+POST_CREATE_URL = reverse('posts:post_create')
+PLACEHOLDER = 'bg-light'
+THUMBNAIL = 'class="card-img my-2" src'
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def gif(name='small.gif'):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='Пост с картинкой', image=gif()
+        )
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Страница не рендерит миниатюру сама и показывает заглушку"""
+        with mock.patch('sorl.thumbnail.default.engine.get_image') as render:
+            response = self.author_client.get(MAIN_URL)
+        render.assert_not_called()
+        self.assertContains(response, PLACEHOLDER)
+        self.assertNotContains(response, THUMBNAIL)
+        self.assertIsNone(ready_thumbnail(self.post.image))
+
+    def test_thumbnail_shown_when_ready(self):
+        """Готовая миниатюра сменяет заглушку в закешированной ленте"""
+        self.author_client.get(MAIN_URL)
+        self.assertTrue(make_post_thumbnail(self.post.id))
+        self.assertIsNotNone(ready_thumbnail(self.post.image))
+        response = self.author_client.get(MAIN_URL)
+        self.assertContains(response, THUMBNAIL)
+        self.assertNotContains(response, PLACEHOLDER)
+
+    def test_feed_page_batches_thumbnail_lookups(self):
+        """Миниатюры страницы ленты ищутся одним запросом на все картинки"""
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user, text=f'Пост {i}', image=gif(f'{i}.gif')
+            )
+            for i in range(2)
+        ]
+        for post in posts:
+            make_post_thumbnail(post.id)
+        # Посты с уменьшенными копиями миниатюры не ищут.
+        Post.objects.update(image_variants='')
+        cache.clear()
+        # Число постов, страница и один запрос к kvstore.
+        with mock.patch(
+            'sorl.thumbnail.default.kvstore.get'
+        ) as get, self.assertNumQueries(3):
+            response = Client().get(MAIN_URL)
+        get.assert_not_called()
+        self.assertContains(response, THUMBNAIL, count=len(posts))
+        self.assertEqual(
+            set(ready_thumbnails([post.image for post in posts])),
+            {post.image.name for post in posts}
+        )
+
+    def test_create_schedules_thumbnail_after_commit(self):
+        """Сохранение поста с картинкой ставит миниатюру в очередь"""
+        with mock.patch('posts.views.transaction.on_commit') as on_commit, \
+                mock.patch('posts.views.schedule_thumbnail') as schedule:
+            self.author_client.post(POST_CREATE_URL, {
+                'text': 'Новый пост', 'image': gif('new.gif'),
+            })
+            on_commit.call_args[0][0]()
+        post = Post.objects.get(text='Новый пост')
+        schedule.assert_called_once_with(post.id)
+
+    def test_backfill_command(self):
+        """Команда готовит миниатюры и считает картинки без файла"""
+        Post.objects.create(
+            author=self.user, text='Без файла', image='posts/missing.gif'
+        )
+        out = StringIO()
+        call_command('make_thumbnails', workers=0, stdout=out)
+        self.assertIn('Миниатюр готово: 1', out.getvalue())
+        self.assertIn('без файла: 1', out.getvalue())
+        self.assertIsNotNone(ready_thumbnail(self.post.image))
@@ -0,0 +1,165 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Post, Profile, TimelineEntry, User
+from ..timeline import CELEBRITIES_KEY
+
+AUTHOR = 'author'
+FOLLOWER = 'follower'
+FOLLOW_URL = reverse('posts:follow_index')
+PROFILE_FOLLOW_URL = reverse('posts:profile_follow', args=[AUTHOR])
+PROFILE_UNFOLLOW_URL = reverse('posts:profile_unfollow', args=[AUTHOR])
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Старый пост')
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+
+    def setUp(self):
+        cache.clear()
+
+    def entries(self):
+        return set(TimelineEntry.objects.filter(
+            user=self.follower).values_list('post_id', flat=True))
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дополняет ленту, отписка очищает её."""
+        self.follower_client.get(PROFILE_FOLLOW_URL)
+        self.assertEqual(self.entries(), {self.old_post.id})
+        self.follower_client.get(PROFILE_UNFOLLOW_URL)
+        self.assertEqual(self.entries(), set())
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertIn(post.id, self.entries())
+        self.assertEqual(
+            list(self.follower_client.get(FOLLOW_URL).context['page_obj']),
+            [post, self.old_post]
+        )
+
+    def test_fan_out_is_one_insert(self):
+        """Раскладка поста - один INSERT при любом числе подписчиков."""
+        def post_queries(followers):
+            for i in range(followers):
+                Follow.objects.create(
+                    user=User.objects.create_user(
+                        username=f'reader{User.objects.count()}'
+                    ),
+                    author=self.author,
+                )
+            with CaptureQueriesContext(connection) as queries:
+                Post.objects.create(author=self.author, text='Новый пост')
+            return len(queries)
+        self.assertEqual(post_queries(2), post_queries(20))
+
+    def test_prune_timelines(self):
+        """Ленты обрезаются до TIMELINE_LENGTH последних записей."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.entries(), {post.id, self.old_post.id})
+        with mock.patch('posts.timeline.TIMELINE_LENGTH', 1):
+            call_command('rebuild_timelines', prune=True,
+                         stdout=mock.Mock())
+        self.assertEqual(self.entries(), {post.id})
+
+    def test_celebrity_posts_merged_on_read(self):
+        """Посты популярных авторов подмешиваются при чтении."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.follower, author=reader)
+        own = Post.objects.create(author=reader, text='Пост из ленты')
+        with mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 1):
+            Follow.objects.create(user=reader, author=self.author)
+            cache.delete(CELEBRITIES_KEY)
+            Follow.objects.create(user=self.follower, author=self.author)
+            post = Post.objects.create(author=self.author, text='Новый пост')
+            self.assertEqual(self.entries(), {own.id})
+            self.assertEqual(
+                list(self.follower_client.get(FOLLOW_URL).context[
+                    'page_obj'
+                ]),
+                [post, own, self.old_post]
+            )
+
+    def test_former_celebrity_posts_stay(self):
+        """Посты, не разложенные, пока автор был популярен, остаются
+        в лентах, когда подписчиков стало меньше порога."""
+        reader = User.objects.create_user(username='reader')
+        with mock.patch('posts.timeline.TIMELINE_FANOUT_LIMIT', 1):
+            Follow.objects.create(user=reader, author=self.author)
+            Follow.objects.create(user=self.follower, author=self.author)
+            cache.delete(CELEBRITIES_KEY)
+            post = Post.objects.create(author=self.author, text='Новый пост')
+            Follow.objects.filter(user=reader).delete()
+            cache.delete(CELEBRITIES_KEY)
+            newer = Post.objects.create(author=self.author, text='Ещё пост')
+            self.assertEqual(
+                list(self.follower_client.get(FOLLOW_URL).context[
+                    'page_obj'
+                ]),
+                [newer, post, self.old_post]
+            )
+        call_command('rebuild_timelines', stdout=mock.Mock())
+        self.assertEqual(
+            self.entries(), {newer.id, post.id, self.old_post.id}
+        )
+        self.assertFalse(
+            Profile.objects.get(user=self.author).merge_on_read
+        )
+
+    def test_cursor_pages(self):
+        """Страницы по курсору идут без пропусков и повторов."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        for i in range(5):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        with mock.patch('posts.views.POSTS_PER_PAGE', 2):
+            page = self.follower_client.get(FOLLOW_URL).context['page_obj']
+            seen = list(page)
+            while page.next_cursor:
+                page = self.follower_client.get(
+                    FOLLOW_URL, {'after': page.next_cursor}
+                ).context['page_obj']
+                seen += list(page)
+            previous = self.follower_client.get(
+                FOLLOW_URL, {'before': page.previous_cursor}
+            ).context['page_obj']
+        self.assertEqual(seen, expected)
+        self.assertEqual(list(previous), expected[2:4])
+
+    def test_follow_feed_uses_indexes(self):
+        """Лента подписок читается по индексам, без сортировки."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.follower_client.get(FOLLOW_URL)
+        selects = [
+            query['sql'] for query in queries
+            if 'posts_timelineentry' in query['sql']
+        ]
+        self.assertEqual(len(selects), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {selects[0]}')
+            plan = ' '.join(str(row[-1]) for row in cursor)
+        self.assertIn('timeline_user_date_post_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_rebuild_timelines(self):
+        """rebuild_timelines собирает ленты по существующим подпискам."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=mock.Mock())
+        self.assertEqual(self.entries(), {self.old_post.id})
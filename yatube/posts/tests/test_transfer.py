@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import MediaFile
+
+from ..models import Comment, Follow, Group, Post, Profile, User
+from .test_media import png, run_on_commit
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, 'yatube.jsonl')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        Post.objects.filter(id=self.post.id).update(
+            pub_date='2020-01-02T03:04:05Z'
+        )
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def export(self):
+        call_command('export_yatube', self.path, chunk_size=1,
+                     stderr=StringIO())
+        with open(self.path, encoding='utf-8') as lines:
+            return [json.loads(line) for line in lines]
+
+    def load(self, **options):
+        out = StringIO()
+        call_command('import_yatube', self.path, stdout=out,
+                     stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_export_lines(self):
+        """Выгрузка - строка JSON на запись, модели по зависимостям"""
+        records = self.export()
+        self.assertEqual(
+            [record['model'] for record in records], [
+                'posts.group', 'auth.user', 'auth.user', 'posts.post',
+                'posts.comment', 'posts.follow',
+            ]
+        )
+        post = records[3]
+        self.assertEqual(post['pk'], self.post.id)
+        self.assertEqual(post['fields']['author_id'], self.author.id)
+        self.assertTrue(post['fields']['pub_date'].startswith('2020-01-02'))
+
+    def test_import_into_empty_database(self):
+        """В пустую базу записи встают с прежними id и датами"""
+        self.export()
+        for model in (Follow, Comment, Post, Group, User):
+            model.objects.all().delete()
+        out = self.load(batch_size=1)
+        self.assertIn('Загружено строк: 6', out)
+        self.assertIn('строк/с', out)
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual(post.author.username, 'author')
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            Profile.objects.get(user__username='author').followers_count, 1
+        )
+        self.assertTrue(post.timeline_entries.exists())
+
+    def test_import_remaps_ids(self):
+        """В непустой базе посты получают новые id, пользователи
+        и группы находятся по username и slug
+        """
+        self.export()
+        self.load()
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        copy = Post.objects.exclude(id=self.post.id).get()
+        self.assertEqual(
+            (copy.author, copy.group, copy.text),
+            (self.author, self.group, self.post.text)
+        )
+        self.assertEqual(copy.comments.get().author, self.reader)
+        self.assertEqual(
+            Profile.objects.get(user=self.author).posts_count, 2
+        )
+
+    @mock.patch('posts.signals.transaction.on_commit', run_on_commit)
+    def test_imported_images_referenced(self):
+        """Импорт учитывает ссылки на картинки: удаление такой же
+        загрузки не стирает файл импортированного поста
+        """
+        self.post.image = png()
+        self.post.save()
+        name = self.post.image.name
+        self.export()
+        # В базе назначения нет записей о файлах, скопированных с медиа.
+        MediaFile.objects.all().delete()
+        self.load()
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
+        upload = Post.objects.create(
+            author=self.author, text='Та же картинка', image=png()
+        )
+        self.assertEqual(upload.image.name, name)
+        upload.delete()
+        self.assertTrue(Post.image.field.storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
@@ -7,8 +7,10 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 
-from ..models import Post, Group, User, Follow
-from ..settings import POSTS_PER_PAGE
+from ..counters import follow_feed
+from ..generations import feed_generation, follow_feed_key
+from ..models import Comment, Post, Group, User, Follow
+from ..settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
 SLUG = 'test-slug-1'
 SLUG2 = 'test-slug-2'
@@ -46,6 +48,7 @@ class PostsPageTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
+        cache.clear()
         cls.uploaded = SimpleUploadedFile(
             name='small.gif',
             content=SMALL_GIF,
@@ -82,6 +85,9 @@ class PostsPageTests(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self):
+        cache.clear()
+
     def test_post_pages_show_correct_context(self):
         """Шаблон с постом имеет правильный контекст"""
         urls = [MAIN_URL, GROUP_URL2, PROFILE_URL, POST_URL, FOLLOW_URL]
@@ -149,7 +155,8 @@ class PostsPageTests(TestCase):
     def test_cache_index_page(self):
         """Кэширование главной страницы работает"""
         cache1 = self.authorized_client.get(MAIN_URL)
-        Post.objects.all().delete()
+        # update() идёт мимо сигналов и не сдвигает поколение ленты.
+        Post.objects.update(text='Изменённый текст')
         cache2 = self.authorized_client.get(MAIN_URL)
         self.assertEqual(cache1.content, cache2.content)
         cache.clear()
@@ -179,3 +186,311 @@ class PostsPageTests(TestCase):
         self.authorized_client.post(PROFILE_FOLLOW_URL)
         self.assertFalse(Follow.objects.filter(user=self.user,
                          author=self.user).exists())
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+        cls.group = Group.objects.create(
+            title='Тестовая группа 1',
+            slug=SLUG,
+            description='Тестовое описание 1',)
+        Post.objects.bulk_create(
+            Post(
+                author=cls.users[i % len(cls.users)],
+                text=f'Тестовый пост {i}',
+                group=cls.group,
+            )
+            for i in range(POSTS_PER_PAGE * len(cls.users))
+        )
+        for user in cls.users:
+            Follow.objects.create(author=user, user=cls.follower)
+        cls.guest_client = Client()
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_pages_query_count(self):
+        """Число запросов страницы ленты не зависит от числа постов"""
+        cases = [
+            [MAIN_URL, self.guest_client, 2],
+            [GROUP_URL, self.guest_client, 4],
+            [reverse('posts:profile', args=[self.users[0].username]),
+             self.guest_client, 5],
+            [FOLLOW_URL, self.follower_client, 4],
+        ]
+        for url, client, queries in cases:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']), POSTS_PER_PAGE
+                )
+
+
+class CommentsPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+            for i in range(COMMENTS_PER_PAGE + 5)
+        ]
+        cls.post_url = reverse('posts:post_detail', args=[cls.post.id])
+        cls.comments_url = reverse('posts:post_comments', args=[cls.post.id])
+        cls.guest_client = Client()
+
+    def test_post_detail_shows_first_comments(self):
+        """На странице поста первая порция комментариев по порядку"""
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(self.post_url)
+        comments = response.context['comments']
+        self.assertEqual(
+            list(comments), self.comments[:COMMENTS_PER_PAGE]
+        )
+        self.assertIsNotNone(comments.next_cursor)
+
+    def test_more_comments_fragment(self):
+        """Фрагмент по курсору отдаёт оставшиеся комментарии"""
+        cursor = self.guest_client.get(
+            self.post_url
+        ).context['comments'].next_cursor
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(
+                self.comments_url, {'after': cursor}
+            )
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[COMMENTS_PER_PAGE:])
+        self.assertFalse(comments.has_next())
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertNotContains(response, '<html')
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        cls.other = User.objects.create_user(username=NONFOLLOWER)
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+        cls.group = Group.objects.create(
+            title='Тестовая группа 1',
+            slug=SLUG,
+            description='Тестовое описание 1',)
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост автора', group=cls.group
+        )
+        Post.objects.create(author=cls.other, text='Пост другого автора')
+        Follow.objects.create(author=cls.user, user=cls.follower)
+        cls.guest_client = Client()
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_profiles_cached_separately(self):
+        """Страницы разных авторов не делят закешированный фрагмент"""
+        self.guest_client.get(PROFILE_URL)
+        response = self.guest_client.get(
+            reverse('posts:profile', args=[NONFOLLOWER])
+        )
+        self.assertContains(response, 'Пост другого автора')
+        self.assertNotContains(response, 'Пост автора<')
+
+    def test_writes_invalidate_feeds(self):
+        """Пост и комментарий обновляют закешированные ленты автора"""
+        urls = [MAIN_URL, GROUP_URL, PROFILE_URL, FOLLOW_URL]
+        writes = [
+            ('Новый пост автора', lambda: Post.objects.create(
+                author=self.user, text='Новый пост автора', group=self.group
+            )),
+            ('Комментариев: 1', lambda: Comment.objects.create(
+                post=self.post, author=self.other, text='Комментарий'
+            )),
+        ]
+        for text, write in writes:
+            for url in urls:
+                self.follower_client.get(url)
+            write()
+            for url in urls:
+                with self.subTest(url=url, text=text):
+                    self.assertContains(self.follower_client.get(url), text)
+
+    def test_other_feeds_stay_cached(self):
+        """Пост не сбрасывает кеш лент, в которые не попадает"""
+        other_url = reverse('posts:profile', args=[NONFOLLOWER])
+        cached = self.guest_client.get(other_url).content
+        Post.objects.filter(author=self.other).update(text='Изменённый')
+        Post.objects.create(author=self.user, text='Новый пост автора')
+        self.assertEqual(self.guest_client.get(other_url).content, cached)
+
+    def test_post_write_keeps_follower_generations(self):
+        """Пост автора не трогает поколения лент подписчиков, но меняет
+        ключ их ленты подписок"""
+        feed = follow_feed(self.follower.id)
+        generation = feed_generation(feed)
+        key = follow_feed_key(self.follower.id, [self.user.id])
+        Post.objects.create(author=self.user, text='Новый пост автора')
+        self.assertEqual(feed_generation(feed), generation)
+        self.assertNotEqual(
+            follow_feed_key(self.follower.id, [self.user.id]), key
+        )
+
+    def test_follow_invalidates_follow_feed(self):
+        """Подписка сразу меняет закешированную ленту подписок"""
+        self.follower_client.get(FOLLOW_URL)
+        Follow.objects.create(author=self.other, user=self.follower)
+        self.assertContains(
+            self.follower_client.get(FOLLOW_URL), 'Пост другого автора'
+        )
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        cls.group = Group.objects.create(
+            title='Тестовая группа 1',
+            slug=SLUG,
+            description='Тестовое описание 1',)
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+        cls.post_url = reverse('posts:post_detail', args=[cls.post.id])
+        cls.urls = [
+            # Адрес и число запросов валидатора.
+            [MAIN_URL, 0],
+            [GROUP_URL, 1],
+            [PROFILE_URL, 1],
+            [cls.post_url, 1],
+        ]
+        cls.guest_client = Client()
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified_before_page_queries(self):
+        """Совпавший ETag даёт 304 без запросов страницы"""
+        for url, queries in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(queries):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        """Last-Modified поста принимается в If-Modified-Since"""
+        last_modified = self.guest_client.get(self.post_url)['Last-Modified']
+        response = self.guest_client.get(
+            self.post_url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_feeds_without_last_modified(self):
+        """Ленты не отдают Last-Modified: правка и удаление поста не
+        сдвигают дату самого нового поста"""
+        for url, _ in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotIn('Last-Modified', response)
+                etag = response['ETag']
+                Post.objects.filter(id=self.post.id).first().save()
+                self.assertEqual(
+                    self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    ).status_code,
+                    200
+                )
+
+    def test_writes_change_etag(self):
+        """Новый пост и комментарий меняют ETag страниц"""
+        writes = [
+            lambda: Post.objects.create(
+                author=self.user, text='Новый пост', group=self.group
+            ),
+            lambda: Comment.objects.create(
+                post=self.post, author=self.user, text='Комментарий'
+            ),
+        ]
+        for write in writes:
+            etags = {
+                url: self.guest_client.get(url)['ETag']
+                for url, _ in self.urls
+            }
+            write()
+            for url, _ in self.urls:
+                with self.subTest(url=url):
+                    self.assertEqual(
+                        self.guest_client.get(
+                            url, HTTP_IF_NONE_MATCH=etags[url]
+                        ).status_code,
+                        200
+                    )
+
+    def test_header_edits_change_etag(self):
+        """Правка группы и имени автора меняет ETag их страниц"""
+        edits = [
+            [GROUP_URL, lambda: Group.objects.filter(
+                id=self.group.id
+            ).update(title='Новое название')],
+            [GROUP_URL, lambda: Group.objects.filter(
+                id=self.group.id
+            ).update(description='Новое описание')],
+            [PROFILE_URL, lambda: User.objects.filter(
+                id=self.user.id
+            ).update(first_name='Новое имя')],
+            [PROFILE_URL, lambda: User.objects.filter(
+                id=self.user.id
+            ).update(last_name='Новая фамилия')],
+        ]
+        for url, edit in edits:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                edit()
+                self.assertEqual(
+                    self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    ).status_code,
+                    200
+                )
+
+    def test_etag_depends_on_viewer(self):
+        """ETag гостя не подходит авторизованному пользователю"""
+        for url, _ in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                self.assertEqual(
+                    self.authorized_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    ).status_code,
+                    200
+                )
+
+    def test_cache_headers(self):
+        """Ответы гостю публичные, пользователю - приватные"""
+        for url, _ in self.urls:
+            with self.subTest(url=url):
+                guest = self.guest_client.get(url)
+                self.assertIn('public', guest['Cache-Control'])
+                self.assertIn('s-maxage', guest['Cache-Control'])
+                self.assertIn('Cookie', guest['Vary'])
+                authorized = self.authorized_client.get(url)
+                self.assertIn('private', authorized['Cache-Control'])
+                self.assertIn('Cookie', authorized['Vary'])
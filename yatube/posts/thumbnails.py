@@ -0,0 +1,154 @@
+import logging
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from django.db.models.functions import Now
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.metrics import observe
+from core.processes import django_pool
+
+from .images import write_variants
+from .models import Post
+from .settings import THUMBNAIL_GEOMETRY, THUMBNAIL_OPTIONS, THUMBNAIL_WORKERS
+from .signals import touch_post_feeds
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def make_thumbnail(name):
+    """Готовит миниатюру картинки поста. False - исходника нет.
+
+    Исходник читается хранилищем поля: оно входит в ключ kvstore,
+    который ищет рендер страниц.
+    """
+    source = ImageFile(name, Post.image.field.storage)
+    if not source.exists():
+        return False
+    get_thumbnail(source, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS)
+    return True
+
+
+def make_post_thumbnail(post_id):
+    """Миниатюра и уменьшенные копии картинки поста. Страницы
+    с заглушкой на её месте устаревают: сдвигаются поколения лент
+    и дата изменения поста.
+    """
+    post = Post.objects.filter(id=post_id).values_list(
+        'image', 'author_id', 'group_id'
+    ).first()
+    if post is None or not post[0]:
+        return False
+    started = time.perf_counter()
+    if not make_thumbnail(post[0]):
+        return False
+    thumbnail_done = time.perf_counter()
+    widths = write_variants(post[0]) or []
+    observe('yatube_thumbnail_duration_seconds', {'stage': 'thumbnail'},
+            thumbnail_done - started)
+    observe('yatube_thumbnail_duration_seconds', {'stage': 'variants'},
+            time.perf_counter() - thumbnail_done)
+    # Картинку могли заменить, пока готовились копии.
+    Post.objects.filter(id=post_id, image=post[0]).update(
+        updated=Now(), image_variants=' '.join(map(str, widths))
+    )
+    touch_post_feeds(post[1], post[2])
+    return True
+
+
+def thumbnail_file(file_):
+    """Миниатюра картинки как ImageFile - без обращения к kvstore.
+
+    Имя считается так же, как в ThumbnailBackend.get_thumbnail.
+    """
+    backend = default.backend
+    source = ImageFile(file_)
+    options = dict(THUMBNAIL_OPTIONS)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(
+        source, THUMBNAIL_GEOMETRY, options
+    )
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(file_):
+    """Готовая миниатюра из kvstore или None, картинку не открывает."""
+    return default.kvstore.get(thumbnail_file(file_))
+
+
+def ready_thumbnails(files):
+    """Готовые миниатюры картинок: {имя картинки: миниатюра}.
+
+    Для kvstore cached_db это один get_many кеша и один запрос к базе
+    на промахи вместо поиска на каждую картинку.
+    """
+    kvstore = default.kvstore
+    names = {
+        add_prefix(thumbnail_file(file_).key): file_.name
+        for file_ in files if file_
+    }
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        thumbnails = {
+            file_.name: ready_thumbnail(file_) for file_ in files if file_
+        }
+        return {
+            name: thumbnail for name, thumbnail in thumbnails.items()
+            if thumbnail is not None
+        }
+    values = kvstore.cache.get_many(list(names))
+    missing = set(names) - set(values)
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        # Промахи кешируются так же, как в KVStore._get_raw.
+        kvstore.cache.set_many({
+            key: found.get(key, cached_db_kvstore.EMPTY_VALUE)
+            for key in missing
+        }, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    return {
+        names[key]: deserialize_image_file(value)
+        for key, value in values.items()
+        if value and value != cached_db_kvstore.EMPTY_VALUE
+    }
+
+
+def log_failure(future):
+    if future.exception() is not None:
+        logger.error('Миниатюра не создана', exc_info=future.exception())
+
+
+def schedule_thumbnail(post_id):
+    """Отдаёт картинку поста пулу процессов, не дожидаясь миниатюры.
+
+    Упавший пул пересоздаётся; если не вышло и так, миниатюру
+    подготовит make_thumbnails, а запрос не ломается.
+    """
+    global _executor
+    for _ in range(2):
+        if _executor is None:
+            _executor = django_pool(THUMBNAIL_WORKERS)
+        try:
+            future = _executor.submit(make_post_thumbnail, post_id)
+        except BrokenProcessPool:
+            _executor = None
+            continue
+        future.add_done_callback(log_failure)
+        return
+    logger.error('Пул миниатюр недоступен, пост %s пропущен', post_id)
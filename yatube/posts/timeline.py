@@ -0,0 +1,142 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Subquery
+
+from .models import Follow, Post, Profile, TimelineEntry
+from .settings import (
+    TIMELINE_CELEBRITIES_TIMEOUT, TIMELINE_FANOUT_LIMIT, TIMELINE_LENGTH
+)
+
+CELEBRITIES_KEY = 'timeline_celebrities'
+
+
+def followers_of(author_id):
+    return Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+
+
+def celebrity_ids():
+    """Авторы, чьи посты не раскладываются по лентам подписчиков."""
+    celebrities = cache.get(CELEBRITIES_KEY)
+    if celebrities is None:
+        celebrities = frozenset(
+            Profile.objects.filter(
+                followers_count__gt=TIMELINE_FANOUT_LIMIT
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(CELEBRITIES_KEY, celebrities, TIMELINE_CELEBRITIES_TIMEOUT)
+    return celebrities
+
+
+def prune(user_id):
+    """Обрезает ленту пользователя до TIMELINE_LENGTH записей."""
+    cutoff = TimelineEntry.objects.filter(
+        user_id=user_id
+    ).order_by('-pub_date').values('pub_date')[
+        TIMELINE_LENGTH - 1:TIMELINE_LENGTH
+    ]
+    TimelineEntry.objects.filter(
+        user_id=user_id, pub_date__lt=Subquery(cutoff)
+    ).delete()
+
+
+def prune_timelines():
+    """Обрезает все ленты до TIMELINE_LENGTH записей одним DELETE.
+
+    Запись в ленту при новом посте ничего не удаляет, чтобы не делать
+    запрос на каждого подписчика; ленты обрезает по расписанию
+    rebuild_timelines --prune.
+    Возвращает число удалённых записей.
+    """
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+            f'PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+            f') AS position FROM {table}) ranked WHERE position > %s)',
+            [TIMELINE_LENGTH],
+        )
+        return cursor.rowcount
+
+
+def skips_fan_out(author_id):
+    """Посты популярного автора не раскладываются по лентам. Такой
+    автор помечается merge_on_read, и его посты подмешиваются при
+    чтении, пока rebuild_timelines не разложит их, - даже если
+    подписчиков стало меньше порога.
+    """
+    if author_id not in celebrity_ids():
+        return False
+    Profile.objects.filter(user_id=author_id, merge_on_read=False).update(
+        merge_on_read=True
+    )
+    return True
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора
+    одним INSERT.
+    """
+    if skips_fan_out(post.author_id):
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers_of(post.author_id)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id, trim=True):
+    """Добавляет в ленту нового подписчика последние посты автора."""
+    if skips_fan_out(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    if trim:
+        prune(user_id)
+
+
+def drop(user_id, author_id):
+    """Убирает из ленты отписавшегося посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def followed_authors(user_id):
+    """Авторы, на которых подписан пользователь: {id: подмешивать ли
+    его посты при чтении}.
+
+    Флаг merge_on_read ставит сама запись, пропуская раскладку, так что
+    чтение и запись не расходятся. Пост, попавший и в ленту, и в посты
+    автора, TimelinePaginator сливает без повторов.
+    """
+    return dict(Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', 'author__profile__merge_on_read'
+    ))
+
+
+def timeline_sources(user_id, authors):
+    """Источники ленты подписок для TimelinePaginator: записи ленты
+    пользователя и посты авторов из authors, помеченных merge_on_read.
+    Записи ленты читаются по своему индексу вместе с постами.
+    """
+    return [(
+        {'timeline_entries__user_id': user_id},
+        'timeline_entries__pub_date', 'timeline_entries__post__id',
+    )] + [
+        ({'author_id': author_id}, 'pub_date', 'id')
+        for author_id, merged in sorted(authors.items()) if merged
+    ]
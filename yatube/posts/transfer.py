@@ -0,0 +1,158 @@
+"""Перенос данных между окружениями строками JSON Lines.
+
+Каждая строка - {"model": …, "pk": …, "fields": {…}}, модели идут
+в порядке зависимостей MODELS. Импорт не держит таблицу соответствия
+id: новые строки получают id = старый id + максимум id в базе на начало
+импорта. Пользователи и группы, уже существующие в базе (по username
+и slug), не создаются, ссылки на них переводятся на найденные строки.
+"""
+import json
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import Comment, Follow, Group, Post, User
+
+MODELS = (
+    (Group, ('title', 'slug', 'description')),
+    (User, (
+        'username', 'password', 'first_name', 'last_name', 'email',
+        'is_staff', 'is_active', 'is_superuser', 'date_joined', 'last_login',
+    )),
+    (Post, (
+        'text', 'pub_date', 'updated', 'author_id', 'group_id', 'image',
+        'image_width', 'image_height', 'image_hash', 'image_placeholder',
+        'image_variants',
+    )),
+    (Comment, ('post_id', 'author_id', 'text', 'created')),
+    (Follow, ('user_id', 'author_id')),
+)
+FIELDS = dict(MODELS)
+# Куда ведут внешние ключи и по какому полю узнаются существующие строки.
+REFERENCES = {
+    'author_id': User, 'user_id': User, 'group_id': Group, 'post_id': Post,
+}
+NATURAL_KEYS = {Group: 'slug', User: 'username'}
+
+
+def export_lines(model, chunk_size):
+    """Строки JSON Lines одной модели; в памяти не больше chunk_size."""
+    label = model._meta.label_lower
+    rows = model.objects.order_by('pk').values('pk', *FIELDS[model])
+    for row in rows.iterator(chunk_size=chunk_size):
+        pk = row.pop('pk')
+        yield json.dumps(
+            {'model': label, 'pk': pk, 'fields': row},
+            cls=DjangoJSONEncoder, ensure_ascii=False,
+        ) + '\n'
+
+
+@contextmanager
+def preserved_dates():
+    """Выключает auto_now и auto_now_add: даты берутся из выгрузки."""
+    fields = [
+        field for model, _ in MODELS for field in model._meta.fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    """Пишет строки выгрузки пачками bulk_create, транзакция на пачку."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.offsets = {
+            model: model.objects.aggregate(top=Max('pk'))['top'] or 0
+            for model, _ in MODELS
+        }
+        # Старый id -> id существующей строки с тем же естественным
+        # ключом. Растёт только с числом совпавших строк.
+        self.existing = {model: {} for model in NATURAL_KEYS}
+        self.model = None
+        self.batch = []
+        self.counts = {model: 0 for model, _ in MODELS}
+
+    def new_id(self, model, pk):
+        if pk is None:
+            return None
+        return self.existing.get(model, {}).get(pk, pk + self.offsets[model])
+
+    def add(self, record):
+        model = apps.get_model(record['model'])
+        if model not in FIELDS:
+            raise ValueError(f'Неизвестная модель {record["model"]}')
+        if model is not self.model:
+            self.flush()
+            self.model = model
+        self.batch.append(record)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        model, records, self.batch = self.model, self.batch, []
+        key = NATURAL_KEYS.get(model)
+        if key is not None:
+            found = dict(model.objects.filter(**{
+                f'{key}__in': [record['fields'][key] for record in records]
+            }).values_list(key, 'pk'))
+            for record in records:
+                if record['fields'][key] in found:
+                    self.existing[model][record['pk']] = found[
+                        record['fields'][key]
+                    ]
+            records = [
+                record for record in records
+                if record['fields'][key] not in found
+            ]
+        objects = []
+        for record in records:
+            fields = {
+                name: self.new_id(REFERENCES[name], value)
+                if name in REFERENCES else value
+                for name, value in record['fields'].items()
+                if name in FIELDS[model]
+            }
+            objects.append(model(
+                pk=self.new_id(model, record['pk']), **fields
+            ))
+        with transaction.atomic(), preserved_dates():
+            # Подписка могла уже быть между найденными пользователями.
+            model.objects.bulk_create(
+                objects, ignore_conflicts=model is Follow
+            )
+        self.counts[model] += len(objects)
+
+    def finish(self):
+        """Дописывает последнюю пачку и сдвигает последовательности id."""
+        self.flush()
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [model for model, _ in MODELS]
+            ):
+                cursor.execute(sql)
+
+
+def rebuild_derived(stdout):
+    """После bulk_create: сигналы не работали, поэтому профили,
+    счётчики, ленты подписок и закешированные ленты собираются заново.
+    """
+    call_command('recount', stdout=stdout)
+    call_command('rebuild_timelines', stdout=stdout)
+    cache.clear()
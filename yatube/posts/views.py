@@ -1,34 +1,64 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import (render, get_object_or_404, redirect)
 
+from .conditions import (
+    conditional_page, group_state, index_state, post_state, profile_state
+)
+from .counters import INDEX_FEED, author_feed, group_feed
 from .forms import PostForm, CommentForm
+from .generations import feed_cache_key, follow_feed_key
 from .models import Post, Group, User, Follow
-from .settings import POSTS_PER_PAGE
-
-
-def page_obj(request, posts):
-    return Paginator(posts, POSTS_PER_PAGE).get_page(request.GET.get('page'))
-
-
+from .paginators import (
+    CommentPaginator, KeysetPaginator, SearchPaginator, TimelinePaginator
+)
+from .search import search_posts
+from .settings import FEED_CACHE_TIMEOUT, POSTS_PER_PAGE
+from .thumbnails import schedule_thumbnail
+from .timeline import followed_authors, timeline_sources
+
+
+def page_obj(request, posts, feed=None):
+    return KeysetPaginator(
+        posts, POSTS_PER_PAGE, feed=feed
+    ).get_page_for(request.GET)
+
+
+def feed_page(request, posts, feed):
+    """Страница ленты и ключ кеша её фрагмента."""
+    # Поколение читается до выборки постов: если запись вклинится
+    # между ними, устаревший фрагмент останется под старым ключом.
+    feed_key = feed_cache_key(feed)
+    return {
+        'page_obj': page_obj(request, posts, feed),
+        'feed_key': feed_key,
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
+
+
+@conditional_page(index_state)
 def index(request):
-    return render(request, 'posts/index.html', {
-        'page_obj': page_obj(request, Post.objects.all()),
-    })
+    return render(request, 'posts/index.html', feed_page(
+        request, Post.objects.for_feed(), INDEX_FEED
+    ))
 
 
+@conditional_page(group_state)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
-        'page_obj': page_obj(request, group.posts.all()),
+        **feed_page(request, group.posts.for_feed(), group_feed(group.id)),
         'group': group,
     })
 
 
+@conditional_page(profile_state)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
     return render(request, 'posts/profile.html', {
-        'page_obj': page_obj(request, author.posts.all()),
+        **feed_page(request, author.posts.for_feed(), author_feed(author.id)),
         'author': author,
         'following':
             request.user != author
@@ -39,14 +69,42 @@ def profile(request, username):
     })
 
 
+@conditional_page(post_state)
 def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'),
+        id=post_id
+    )
     return render(request, 'posts/post_detail.html', {
-        'post': get_object_or_404(Post, id=post_id),
+        'post': post,
+        'comments': CommentPaginator(post).get_page_for(request.GET),
         'form': CommentForm(request.POST or None),
     })
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев фрагментом HTML."""
+    post = get_object_or_404(
+        Post.objects.only('id', 'comments_count'), id=post_id
+    )
+    return render(request, 'posts/includes/comments.html', {
+        'post': post,
+        'comments': CommentPaginator(post).get_page_for(request.GET),
+    })
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': SearchPaginator(
+            search_posts(query), POSTS_PER_PAGE
+        ).get_page_for(request.GET) if query else None,
+    })
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
@@ -56,6 +114,8 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    if post.image:
+        transaction.on_commit(lambda: schedule_thumbnail(post.id))
     return redirect('posts:profile', request.user)
 
 
@@ -74,10 +134,13 @@ def post_edit(request, post_id):
             'post': post,
         })
     form.save()
+    if post.image and 'image' in form.changed_data:
+        transaction.on_commit(lambda: schedule_thumbnail(post.id))
     return redirect('posts:post_detail', post_id=post.id)
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
     if form.is_valid():
@@ -90,13 +153,21 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    authors = followed_authors(request.user.id)
+    # Ключ фрагмента читается до выборки постов, как в feed_page.
+    feed_key = follow_feed_key(request.user.id, authors)
     return render(request, 'posts/follow.html', {
-        'page_obj': page_obj(request, posts),
+        'page_obj': TimelinePaginator(
+            timeline_sources(request.user.id, authors),
+            Post.objects.for_feed(), POSTS_PER_PAGE,
+        ).get_page_for(request.GET),
+        'feed_key': feed_key,
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
     })
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     if request.user.username != username:
         Follow.objects.get_or_create(
@@ -107,6 +178,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     get_object_or_404(
         Follow,
@@ -38,6 +38,11 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Адреса, с которых Prometheus может читать /metrics.
+METRICS_ALLOWED_IPS = [
+    '127.0.0.1',
+]
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -56,6 +61,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.TimingMiddleware',
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -71,7 +77,8 @@ ROOT_URLCONF = "yatube.urls"
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Бэкенд Django, засекающий время рендеринга для Server-Timing.
+        "BACKEND": "core.timing.DjangoTemplates",
         # Добавлено: Искать шаблоны на уровне проекта
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
@@ -141,6 +148,10 @@ STATIC_URL = "/static/"
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки любого размера пишутся во временный файл, а не в память.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
 
 LOGIN_URL = "users:login"
 LOGIN_REDIRECT_URL = "posts:index"
@@ -151,8 +162,42 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+TEST_RUNNER = 'core.testing.StateDirRunner'
+
+# Каталог состояния сайта: общий кеш и другие файлы процессов.
+# Доступен только пользователю приложения; путь задаёт YATUBE_STATE_DIR.
+# Тесты подменяют его временным каталогом (core.testing).
+STATE_DIR = os.environ.get('YATUBE_STATE_DIR') or os.path.join(
+    BASE_DIR, 'state'
+)
+
+# Локальный LRU воркера перед общим для всех воркеров хоста кешем
+# в отображённом в память файле. Поколения и счётчики лент читаются
+# только из общего кеша.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'VOLATILE_PREFIXES': ('feed_generation:', 'feed_count:'),
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.MmapCache',
+        'LOCATION': os.path.join(STATE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_SIZE': 64 * 1024 * 1024,
+        },
     }
 }
+
+# Файлы метрик процессов, которые складывает /metrics.
+METRICS_DIR = os.path.join(STATE_DIR, 'metrics')
+
+# Запросы к базе дольше порога (мс) пишутся в журнал с планом,
+# отчёт по журналу - manage.py slow_queries.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG = os.path.join(STATE_DIR, 'slow-queries.jsonl')
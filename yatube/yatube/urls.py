@@ -3,9 +3,12 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics
+
 urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls')),